@@ -0,0 +1,343 @@
+"""
+ASGI entry point. POST /quizzes, the route quiz traffic hammers, is served on the event loop
+with an async SQLAlchemy engine (asyncpg for Postgres, aiosqlite for SQLite), so a request
+waiting on the database holds no thread. Every other request, and every quiz request the fast
+path cannot answer from warm in-process state (unknown or unloaded category, exhausted deck,
+invalid body, database error), runs the Flask app unchanged in a thread pool, so the URL
+surface, JSON shapes and error responses stay those of the WSGI app.
+
+    pip install uvicorn asyncpg      # or aiosqlite
+    uvicorn --factory backend.asgi:create_asgi_app --workers 4
+"""
+import asyncio
+import concurrent.futures
+import io
+import os
+import sys
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+from werkzeug.http import parse_accept_header
+
+from backend.flaskr import create_app
+from backend.compression import negotiate_encoding, compress_bytes, COMPRESSION_MIN_BYTES
+from backend.metrics import request_metrics
+from backend.pool import pool_options, PoolStats
+from backend.ratelimit import admission, MemoryBucketStore, API_KEY_HEADER, ADMITTED_ENVIRON_KEY
+from backend.readmodel import QuestionRecord, select_questions
+from backend.routing import READ_YOUR_WRITES_HEADER, LAST_WRITE_COOKIE
+from backend.sampling import question_sampler
+from backend.sessions import quiz_sessions, MemorySessionStore
+from backend.tables import Question, category_cache
+
+ASGI_THREADS = 16
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+QUEUED_CHUNKS = 8
+
+"""
+async_database_uri(uri)
+    the async driver URI for a synchronous database URI, e.g. postgresql+asyncpg:// for
+    postgresql://. in-memory SQLite is a different database per engine and is refused
+"""
+
+
+def async_database_uri(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError('no async driver for ' + backend + ', set ASYNC_DATABASE_URI')
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise ValueError('in-memory SQLite cannot be shared with an async engine, set ASYNC_DATABASE_URI')
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings are bytes decoded as latin-1
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    # the body is buffered, so its length is known even for a chunked request
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+"""
+WsgiFallback(wsgi_app, executor)
+    runs a WSGI app for ASGI requests on a thread of executor. response chunks are handed to
+    the event loop as the app produces them, at most QUEUED_CHUNKS ahead of the client, so the
+    streamed exports stay streamed
+"""
+
+
+class WsgiFallback:
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        await self.call(scope, await _read_body(receive), send)
+
+    async def call(self, scope, body, send, environ=None):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(QUEUED_CHUNKS)
+        start = {}
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            start['message'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            }
+            return put
+
+        def run():
+            try:
+                result = self.wsgi_app(dict(_environ(scope, body), **(environ or {})), start_response)
+                try:
+                    for chunk in result:
+                        if chunk:
+                            put(chunk)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                put(None)
+            except BaseException as e:
+                put(e)
+
+        future = loop.run_in_executor(self.executor, run)
+        while True:
+            item = await queue.get()
+            if isinstance(item, BaseException):
+                raise item
+            if not start.get('sent'):
+                start['sent'] = True
+                await send(start['message'])
+            if item is None:
+                await send({'type': 'http.response.body', 'body': b''})
+                break
+            await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+        await future
+
+
+"""
+TriviaASGI(flask_app)
+    ASGI app over an existing Flask app: POST /quizzes on the async engine, everything else
+    through WsgiFallback. the async engine connects to ASYNC_DATABASE_URI (or env
+    ASYNC_DATABASE_URL), by default the async driver's URI for the replica or the primary,
+    with the DB_POOL_* pool settings. quiz requests pass the same admission control as the
+    Flask route and are charged once, whichever path serves them
+"""
+
+
+class TriviaASGI:
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        config = flask_app.config
+        config.setdefault('ASGI_THREADS', ASGI_THREADS)
+        self.replica = bool(config.get('SQLALCHEMY_REPLICA_URI'))
+        uri = config.get('ASYNC_DATABASE_URI') or os.getenv('ASYNC_DATABASE_URL') or \
+            async_database_uri(config.get('SQLALCHEMY_REPLICA_URI') or config['SQLALCHEMY_DATABASE_URI'])
+        options = pool_options(flask_app, uri, PoolStats())
+        if options:
+            # the same sizing on the asyncio flavour of the queue pool
+            options['poolclass'] = AsyncAdaptedQueuePool
+        self.engine = create_async_engine(uri, **options)
+        self.executor = concurrent.futures.ThreadPoolExecutor(config['ASGI_THREADS'], thread_name_prefix='wsgi')
+        self.wsgi = WsgiFallback(flask_app, self.executor)
+        self.quiz_cost = getattr(flask_app.view_functions['get_next_question'], 'rate_cost', 1)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        if scope['method'] != 'POST' or scope['path'] != '/quizzes':
+            await self.wsgi(scope, receive, send)
+            return
+        body = await _read_body(receive)
+        started = time.perf_counter()
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        try:
+            admission.enter()
+        except ServiceUnavailable:
+            # the Flask route sheds the request with its JSON error response
+            await self.wsgi.call(scope, body, send)
+            return
+        try:
+            try:
+                key = admission.client_key(headers.get(API_KEY_HEADER.lower()), (scope.get('client') or ('',))[0])
+                if admission.store is None or isinstance(admission.store, MemoryBucketStore):
+                    admission.take(key, self.quiz_cost)
+                else:
+                    # a shared store can block (SQLite waits on its write lock), keep it off the event loop
+                    await asyncio.get_running_loop().run_in_executor(self.executor, admission.take, key,
+                                                                     self.quiz_cost)
+            except TooManyRequests:
+                await self.wsgi.call(scope, body, send)
+                return
+            response = await self.next_question(headers, body)
+            if response is None:
+                # already admitted and charged, the route must not charge again
+                await self.wsgi.call(scope, body, send, {ADMITTED_ENVIRON_KEY: True})
+                return
+        finally:
+            admission.leave()
+        await self.respond(send, headers, response, started)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        # aiosqlite connections run on threads of their own that keep the process alive
+        await self.engine.dispose()
+        self.executor.shutdown(wait=False)
+
+    async def question_record(self, question_id):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(select_questions().where(Question.id == question_id))
+            row = result.first()
+        return QuestionRecord(*row) if row is not None else None
+
+    """
+    next_question(headers, body)
+        the POST /quizzes response body when it can be answered from the loaded categories,
+        the sampler's fresh id arrays or an in-process quiz session plus one async query.
+        None hands the request to the Flask route, which loads what is missing or answers
+        with the error response
+    """
+
+    async def next_question(self, headers, body):
+        if not headers.get('content-type', '').startswith('application/json'):
+            return None
+        if self.replica and (READ_YOUR_WRITES_HEADER.lower() in headers or
+                             LAST_WRITE_COOKIE + '=' in headers.get('cookie', '')):
+            # the client must see its own writes, which the Flask route reads from the primary
+            return None
+        try:
+            data = self.app.json.loads(body)
+            session_token = data.get('sessionToken', None)
+            if session_token is None:
+                quiz_category = int(data['quizCategory'])
+                previous_questions = {int(question) for question in data.get('previousQuestions', None) or []}
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+        try:
+            if session_token is not None:
+                if not isinstance(quiz_sessions.store, MemorySessionStore):
+                    return None
+                next_question = None
+                while next_question is None:
+                    try:
+                        _, question_id = quiz_sessions.next(session_token)
+                    except KeyError:
+                        return None
+                    if question_id is None:
+                        return None
+                    next_question = await self.question_record(question_id)
+            else:
+                categories = category_cache.cached()
+                category_ids = question_sampler.cached(quiz_category)
+                if categories is None or quiz_category not in categories or category_ids is None:
+                    return None
+                next_question = None
+                while next_question is None:
+                    question_id = question_sampler.pick(quiz_category, previous_questions, category_ids)
+                    if question_id is None:
+                        return None
+                    next_question = await self.question_record(question_id)
+                    if next_question is None:
+                        question_sampler.discard(quiz_category, question_id)
+        except Exception:
+            return None
+        return self.app.json.dumps_bytes({'question': next_question})
+
+    async def respond(self, send, headers, body, started):
+        response_headers = [
+            (b'content-type', b'application/json'),
+            (b'access-control-allow-headers', b'Content-Type, Authorization'),
+            (b'access-control-allow-headers', b'GET, POST, PATCH, DELETE, OPTIONS'),
+            (b'vary', b'Accept-Encoding')
+        ]
+        if len(body) >= self.app.config.get('COMPRESSION_MIN_BYTES', COMPRESSION_MIN_BYTES):
+            encoding = negotiate_encoding(parse_accept_header(headers.get('accept-encoding')))
+            if encoding is not None:
+                with self.app.app_context():
+                    body = compress_bytes(body, encoding)
+                response_headers.append((b'content-encoding', encoding.encode('latin-1')))
+        response_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        duration = time.perf_counter() - started
+        request_metrics.duration.observe(duration, 'POST', '/quizzes', 200)
+        request_metrics.size.observe(len(body), 'POST', '/quizzes')
+        if self.app.config.get('SERVER_TIMING'):
+            response_headers.append((b'server-timing', 'app;dur={:.3f}'.format(duration * 1000).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+"""
+create_asgi_app(test_config=None)
+    builds the Flask app with create_app(test_config) and wraps it in TriviaASGI
+"""
+
+
+def create_asgi_app(test_config=None):
+    return TriviaASGI(create_app(test_config))
@@ -0,0 +1,163 @@
+"""
+Request drivers and latency summaries shared by the benchmarks.
+
+TestClientDriver calls the app in-process through the Flask test client; HttpDriver talks HTTP
+to a real server, either one started with serve(app) or serve_asgi(app), or any running deployment.
+"""
+import contextlib
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+try:
+    import uvicorn
+except ImportError:  # optional: only needed to benchmark the ASGI app
+    uvicorn = None
+
+
+class TestClientDriver:
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        data = response.get_data()
+        return response.status_code, data
+
+
+"""
+HttpDriver(base_url)
+    keeps one HTTP/1.1 connection per thread open to base_url
+"""
+
+
+class HttpDriver:
+    name = 'wsgi_server'
+
+    def __init__(self, base_url):
+        url = urllib.parse.urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip('/')
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return connection
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        connection = self._connection()
+        try:
+            connection.request(method, self.prefix + path, body=payload, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+"""
+serve(app)
+    runs the app on a threaded Werkzeug WSGI server on a free local port for the duration of
+    the with block and yields its base URL
+"""
+
+
+@contextlib.contextmanager
+def serve(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_port)
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+"""
+serve_asgi(app)
+    runs an ASGI app on uvicorn (one event loop) on a free local port for the duration of the
+    with block and yields its base URL
+"""
+
+
+@contextlib.contextmanager
+def serve_asgi(app):
+    if uvicorn is None:
+        raise RuntimeError('serving the ASGI app needs uvicorn: pip install uvicorn')
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=0, log_level='warning', lifespan='on'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('uvicorn did not start')
+        time.sleep(0.01)
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.servers[0].sockets[0].getsockname()[1])
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+"""
+summarize(samples, seconds, errors)
+    latency percentiles in milliseconds and throughput for a list of request durations that
+    took `seconds` of wall time in total
+"""
+
+
+def summarize(samples, seconds, errors=0):
+    ordered = sorted(samples)
+    milliseconds = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'errorRate': round(errors / len(ordered), 4) if ordered else 0,
+        'throughput': round(len(ordered) / seconds, 2) if seconds > 0 else None,
+        'meanMs': milliseconds(statistics.fmean(ordered)) if ordered else None,
+        'p50Ms': milliseconds(percentile(ordered, 0.50)),
+        'p95Ms': milliseconds(percentile(ordered, 0.95)),
+        'p99Ms': milliseconds(percentile(ordered, 0.99)),
+        'maxMs': milliseconds(ordered[-1]) if ordered else None
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': sys.version.split()[0], 'timestamp': int(time.time())}
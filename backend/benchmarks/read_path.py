@@ -0,0 +1,91 @@
+"""
+ORM hydration against the column projection of backend.readmodel on the read paths.
+
+Each scenario loads the same questions both ways and serializes them with the app's JSON
+provider, as the routes do. Reported per path: median latency, and the peak bytes traced by
+tracemalloc during one run with the blocks still held once it returns.
+
+    python -m backend.benchmarks.read_path --questions 5000 --repeat 200
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+
+from flask import current_app
+
+from backend.benchmarks.synthetic import build_app
+from backend.readmodel import question_page, questions_by_ids, category_questions
+from backend.tables import db, Question
+
+
+def orm_scenarios(ids):
+    return {
+        'page_10': lambda: Question.query.order_by(Question.id).limit(10).all(),
+        'page_100': lambda: Question.query.order_by(Question.id).offset(100).limit(100).all(),
+        'by_ids_100': lambda: Question.query.filter(Question.id.in_(ids)).all(),
+        'category_100': lambda: Question.query.filter_by(category=1).order_by(Question.id).limit(100).all(),
+    }
+
+
+def projection_scenarios(ids):
+    return {
+        'page_10': lambda: question_page(10),
+        'page_100': lambda: question_page(100, offset=100),
+        'by_ids_100': lambda: questions_by_ids(ids),
+        'category_100': lambda: category_questions(1, 100),
+    }
+
+
+def run(load, formatted):
+    questions = load()
+    body = current_app.json.dumps_bytes([question.format() for question in questions] if formatted else questions)
+    # a request ends with its session removed, which drops the hydrated instances
+    db.session.remove()
+    return body
+
+
+def allocations(load, formatted):
+    tracemalloc.start()
+    try:
+        before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        run(load, formatted)
+        after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        return after - before, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(load, formatted, repeat):
+    run(load, formatted)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(load, formatted)
+        samples.append(time.perf_counter() - started)
+    blocks, peak = allocations(load, formatted)
+    return {'median_ms': round(statistics.median(samples) * 1000, 4), 'peak_bytes': peak, 'retained_blocks': blocks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    app = build_app(args.questions, RESPONSE_CACHE='none')
+    report = {'questions': args.questions, 'scenarios': {}}
+    with app.app_context():
+        ids = list(range(1, args.questions + 1, max(1, args.questions // 100)))[:100]
+        orm, projection = orm_scenarios(ids), projection_scenarios(ids)
+        for name in orm:
+            report['scenarios'][name] = {
+                'orm': measure(orm[name], True, args.repeat),
+                'projection': measure(projection[name], False, args.repeat)
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
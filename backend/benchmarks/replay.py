@@ -0,0 +1,221 @@
+"""
+Replay a recorded JSONL request log against the API and report throughput, error rate and
+latency per route.
+
+One request per line:
+
+    {"method": "GET", "path": "/questions?page=2", "timestamp": 1718000000.25, "client": "a1"}
+    {"method": "POST", "path": "/quizzes", "body": {"quizCategory": 1, "previousQuestions": []}}
+
+`path` (or `url`) is required; `method` defaults to GET; `body` is sent as JSON and `headers`
+as given. `timestamp` (epoch seconds or ISO 8601) drives the pacing, `client` (or `session`)
+groups the requests of one user, and `route` overrides the route label, which otherwise is the
+path with numeric segments replaced by <id> and query values dropped. Lines without a path are
+skipped and counted.
+
+Pacing, in the order of precedence:
+
+    --rate R         open loop at R requests per second, in log order
+    --concurrency N  closed loop: N workers replay the clients' sessions; within a session the
+                     recorded gaps between requests are kept as think times
+    (neither)        open loop at the recorded timestamps
+
+--speed divides every recorded gap (2 replays twice as fast). The target is --url, or the app
+built with create_app() from the environment (DATABASE_URL, ...) or, with --questions, on a
+synthetic database, served on a local WSGI server.
+
+    python -m backend.benchmarks.replay traffic.jsonl --url http://localhost:5000 --concurrency 16
+    python -m backend.benchmarks.replay traffic.jsonl --questions 10000 --rate 200
+"""
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import json
+import re
+import threading
+import time
+from datetime import datetime
+
+from backend.benchmarks.harness import HttpDriver, environment, serve, summarize
+
+MAX_IN_FLIGHT = 64
+_NUMERIC_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+Entry = collections.namedtuple('Entry', 'method path body headers timestamp client route')
+
+
+def route_label(method, path):
+    path, _, query = path.partition('?')
+    label = _NUMERIC_SEGMENT.sub('/<id>', path)
+    if query:
+        label += '?' + '&'.join(sorted(parameter.split('=', 1)[0] + '=' for parameter in query.split('&')))
+    return '{} {}'.format(method, label)
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+"""
+read_log(lines)
+    the replayable entries of a JSONL request log and the number of lines skipped
+"""
+
+
+def read_log(lines):
+    entries = []
+    skipped = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            path = record.get('path') or record.get('url')
+            if not path:
+                raise ValueError
+            method = record.get('method', 'GET').upper()
+            entries.append(Entry(method, path, record.get('body'), record.get('headers') or {},
+                                 _timestamp(record.get('timestamp')), record.get('client', record.get('session')),
+                                 record.get('route') or route_label(method, path)))
+        except (ValueError, TypeError, AttributeError):
+            skipped += 1
+    return entries, skipped
+
+
+class Recorder:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.statuses = collections.defaultdict(collections.Counter)
+
+    def send(self, driver, entry):
+        started = time.perf_counter()
+        try:
+            status, _ = driver.request(entry.method, entry.path, entry.body, entry.headers)
+        except OSError:
+            status = None
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[entry.route].append(elapsed)
+            self.statuses[entry.route][str(status)] += 1
+            if status is None or status >= 500:
+                self.errors[entry.route] += 1
+
+    def report(self, seconds):
+        routes = {}
+        for route in sorted(self.samples):
+            routes[route] = dict(summarize(self.samples[route], seconds, self.errors[route]),
+                                 statuses=dict(self.statuses[route]))
+        overall = summarize([sample for samples in self.samples.values() for sample in samples], seconds,
+                            sum(self.errors.values()))
+        return {'overall': overall, 'routes': routes}
+
+
+def _wait_until(deadline):
+    delay = deadline - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def replay_open_loop(driver, recorder, entries, offsets):
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(MAX_IN_FLIGHT) as executor:
+        for entry, offset in zip(entries, offsets):
+            _wait_until(started + offset)
+            executor.submit(recorder.send, driver, entry)
+
+
+def replay_sessions(driver, recorder, entries, concurrency, speed):
+    sessions = collections.OrderedDict()
+    for n, entry in enumerate(entries):
+        # requests without a client are sessions of their own
+        sessions.setdefault(entry.client if entry.client is not None else ('line', n), []).append(entry)
+    queue = collections.deque(sessions.values())
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                session = queue.popleft()
+            previous = None
+            for entry in session:
+                if previous is not None and entry.timestamp is not None and previous.timestamp is not None:
+                    time.sleep(max(0.0, entry.timestamp - previous.timestamp) / speed)
+                recorder.send(driver, entry)
+                previous = entry
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def replay(driver, entries, rate=None, concurrency=None, speed=1.0):
+    recorder = Recorder()
+    started = time.perf_counter()
+    if rate:
+        replay_open_loop(driver, recorder, entries, [n / rate for n in range(len(entries))])
+    elif concurrency:
+        replay_sessions(driver, recorder, entries, concurrency, speed)
+    else:
+        first = next((entry.timestamp for entry in entries if entry.timestamp is not None), None)
+        last = first or 0.0
+        offsets = []
+        for entry in entries:
+            # a line without a timestamp goes right after the one before it
+            last = entry.timestamp if entry.timestamp is not None else last
+            offsets.append(max(0.0, last - first) / speed if first is not None else 0.0)
+        replay_open_loop(driver, recorder, entries, offsets)
+    return recorder.report(time.perf_counter() - started)
+
+
+@contextlib.contextmanager
+def target(args):
+    if args.url:
+        yield args.url
+        return
+    if args.questions is not None:
+        from backend.benchmarks.synthetic import build_app
+        app = build_app(args.questions)
+    else:
+        from backend.flaskr import create_app
+        app = create_app()
+    with serve(app) as url:
+        yield url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help='JSONL request log')
+    parser.add_argument('--url', default=None, help='server to replay against')
+    parser.add_argument('--questions', type=int, default=None,
+                        help='replay against a local app on a synthetic database of this many questions')
+    parser.add_argument('--rate', type=float, default=None, help='requests per second, ignoring the timestamps')
+    parser.add_argument('--concurrency', type=int, default=None, help='closed loop with this many workers')
+    parser.add_argument('--speed', type=float, default=1.0, help='divides the recorded gaps')
+    parser.add_argument('--output', default=None, help='file to write the JSON report to')
+    args = parser.parse_args()
+
+    with open(args.log, encoding='utf-8') as f:
+        entries, skipped = read_log(f)
+    with target(args) as url:
+        report = replay(HttpDriver(url), entries, args.rate, args.concurrency, args.speed)
+    mode = 'rate' if args.rate else 'concurrency' if args.concurrency else 'timestamps'
+    report = dict(environment(), log=args.log, entries=len(entries), skipped=skipped, mode=mode, **report)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
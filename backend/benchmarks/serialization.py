@@ -0,0 +1,62 @@
+"""
+Bytes on the wire and serialization time per endpoint.
+
+A temporary SQLite database is filled with synthetic questions; every endpoint is requested
+once per encoding to measure the body size, and its JSON payload is re-serialized with each
+available provider to time the serialization alone.
+
+    python -m backend.benchmarks.serialization --questions 5000 --repeat 50
+"""
+import argparse
+import json
+import timeit
+
+from backend.benchmarks.synthetic import build_app
+from backend.compression import brotli
+from backend.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+
+ENDPOINTS = (
+    ('GET', '/categories', None),
+    ('GET', '/questions?page=1', None),
+    ('GET', '/questions?page=1&limit=100', None),
+    ('GET', '/categories/1/questions', None),
+    ('POST', '/questions/search', {'searchTerm': 'question'}),
+    ('GET', '/questions/export?format=ndjson', None),
+    ('GET', '/questions/export?format=csv', None),
+)
+
+
+def measure(app, method, path, body, repeat):
+    client = app.test_client()
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+    report = {}
+    for encoding in encodings:
+        response = client.open(path, method=method, json=body, headers={'Accept-Encoding': encoding})
+        report['bytes_' + encoding] = len(response.data)
+    payload = client.open(path, method=method, json=body).get_json(silent=True)
+    if payload is not None:
+        providers = {'stdlib': StdlibJSONProvider(app)}
+        if orjson is not None:
+            providers['orjson'] = OrjsonProvider(app)
+        for name, provider in providers.items():
+            seconds = timeit.timeit(lambda: provider.dumps_bytes(payload), number=repeat)
+            report['serialize_ms_' + name] = round(seconds / repeat * 1000, 4)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = build_app(args.questions, RESPONSE_CACHE='none')
+    report = {'questions': args.questions, 'endpoints': {}}
+    with app.app_context():
+        for method, path, body in ENDPOINTS:
+            report['endpoints'][method + ' ' + path] = measure(app, method, path, body, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
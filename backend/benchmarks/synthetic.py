@@ -0,0 +1,56 @@
+"""
+Synthetic question bank for the benchmarks: an app on a temporary SQLite database (or the
+database given) holding `questions` generated questions spread over the categories.
+
+The data only depends on the number of questions, so runs on different commits see the same
+rows. Every question names one of WORDS, which makes searches for a word selective.
+"""
+import os
+import random
+import tempfile
+
+CATEGORIES = ('Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports')
+WORDS = tuple('{}{}'.format(syllable, n) for n in range(200)
+              for syllable in ('river', 'planet', 'painter', 'empire', 'film'))
+SEED = 19
+
+
+def synthetic_questions(questions):
+    rng = random.Random(SEED)
+    for n in range(questions):
+        yield n, {'question': 'Synthetic question {} about the {}?'.format(n, rng.choice(WORDS)),
+                  'answer': 'Answer {}'.format(n), 'category': rng.randrange(len(CATEGORIES)) + 1,
+                  'difficulty': rng.randrange(5) + 1}
+
+
+"""
+seed(app, questions)
+    fills an empty database with the categories and `questions` synthetic questions.
+    a database that already holds exactly that many questions is reused as it is
+"""
+
+
+def seed(app, questions):
+    from backend.importer import import_questions
+    from backend.tables import db, Category, Question
+
+    with app.app_context():
+        existing = db.session.query(Question).count()
+        if existing == questions and db.session.query(Category).count() == len(CATEGORIES):
+            return
+        if existing or db.session.query(Category).count():
+            raise SystemExit('the benchmark database holds {} questions, expected none or {}'.format(
+                existing, questions))
+        for category_id, category_type in enumerate(CATEGORIES, start=1):
+            db.session.add(Category(category_id, category_type))
+        db.session.commit()
+        import_questions(synthetic_questions(questions), app.config['IMPORT_BATCH_SIZE'])
+
+
+def build_app(questions, **config):
+    from backend.flaskr import create_app
+
+    config.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+    app = create_app(config)
+    seed(app, questions)
+    return app
@@ -0,0 +1,50 @@
+import threading
+
+"""
+CategoryCache(loader)
+    versioned in-memory map of category id -> type.
+    loader is called (inside an app context) to fetch (id, type) rows ordered by id
+    the first time the map is needed and again after every invalidate()
+"""
+
+
+class CategoryCache:
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._categories = None
+        self.version = 0
+
+    def _load(self):
+        categories = self._categories
+        if categories is not None:
+            return categories
+        with self._lock:
+            if self._categories is None:
+                version = self.version
+                rows = self._loader()
+                categories = {row.id: row.type for row in rows}
+                # a write that raced with the load bumped the version; don't keep stale rows
+                if version != self.version:
+                    return categories
+                self._categories = categories
+            return self._categories
+
+    def get(self, category_id):
+        return self._load().get(category_id)
+
+    def cached(self):
+        # the loaded map without loading it, None when the next read would query the database
+        return self._categories
+
+    def all(self):
+        return dict(self._load())
+
+    def format(self):
+        return [{'id': id, 'type': type} for id, type in self._load().items()]
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._categories = None
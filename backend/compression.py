@@ -0,0 +1,89 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: responses are only gzipped without it
+    brotli = None
+
+from flask import current_app, request
+
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+"""
+negotiate_encoding(accepted=None)
+    the encoding to answer the request (or the parsed Accept-Encoding `accepted`) with:
+    'br' when brotli is installed and accepted, else 'gzip' when accepted, else None
+"""
+
+
+def negotiate_encoding(accepted=None):
+    if accepted is None:
+        accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=current_app.config['COMPRESSION_BROTLI_QUALITY'])
+        return compressor.process, compressor.finish
+    # wbits=31 writes the gzip header and trailer
+    compressor = zlib.compressobj(current_app.config['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+"""
+compress_bytes(body, encoding)
+    the whole body compressed with encoding, at the configured level
+"""
+
+
+def compress_bytes(body, encoding):
+    compress, flush = _compressor(encoding)
+    return compress(body) + flush()
+
+
+def _compressed_stream(chunks, compress, flush):
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+"""
+compress_response(response)
+    after_request hook that compresses 200 responses of a text mimetype with the negotiated
+    encoding. buffered bodies under COMPRESSION_MIN_BYTES are sent as they are; streamed
+    bodies (the exports) are compressed chunk by chunk as they are produced
+"""
+
+
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = _compressed_stream(response.response, *_compressor(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < current_app.config['COMPRESSION_MIN_BYTES']:
+            return response
+        response.set_data(compress_bytes(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
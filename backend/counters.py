@@ -0,0 +1,93 @@
+import threading
+import time
+
+from flask import current_app
+
+"""
+QuestionCounter(loader, reconcile_interval)
+    global and per-category question counts kept in memory.
+    loader is called (inside an app context) to fetch (category, count) rows;
+    the counts are adjusted on every insert/delete seen through question_changed()
+    and reconciled against the loader once they are older than reconcile_interval seconds.
+    only the first load runs on the request path: stale counts are still served while a
+    background thread, one at a time, reloads them in its own app context
+"""
+
+
+class QuestionCounter:
+
+    def __init__(self, loader, reconcile_interval=60):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._counts = None
+        self._total = 0
+        self._loaded_at = 0.0
+        self._reconciling = False
+        self.reconcile_interval = reconcile_interval
+
+    def _stale(self):
+        return time.monotonic() - self._loaded_at >= self.reconcile_interval
+
+    def _set(self, rows):
+        self._counts = {category: count for category, count in rows}
+        self._total = sum(self._counts.values())
+        self._loaded_at = time.monotonic()
+
+    def _load(self):
+        counts = self._counts
+        if counts is None:
+            with self._lock:
+                if self._counts is None:
+                    self._set(self._loader())
+                return self._counts
+        if self._stale():
+            self._start_reconcile()
+        return counts
+
+    def _start_reconcile(self):
+        with self._lock:
+            if self._reconciling or not self._stale():
+                return
+            self._reconciling = True
+        app = current_app._get_current_object()
+        threading.Thread(target=self._reconcile, args=(app,), name='question-counts', daemon=True).start()
+
+    def _reconcile(self, app):
+        try:
+            with app.app_context():
+                rows = self._loader()
+            # changes seen while the loader ran may be missed or counted twice, until the next reconcile
+            with self._lock:
+                if self._counts is not None:
+                    self._set(rows)
+        finally:
+            self._reconciling = False
+
+    def total(self):
+        self._load()
+        return self._total
+
+    def category(self, category_id):
+        return self._load().get(category_id, 0)
+
+    def question_changed(self, action, questions):
+        if action == 'update':
+            # the previous category is unknown, recount in the background on the next read
+            self.expire()
+            return
+        step = 1 if action == 'insert' else -1
+        with self._lock:
+            if self._counts is None:
+                return
+            for question in questions:
+                category = question['category']
+                self._counts[category] = max(self._counts.get(category, 0) + step, 0)
+                self._total = max(self._total + step, 0)
+
+    def expire(self):
+        with self._lock:
+            self._loaded_at = float('-inf')
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
@@ -3,4 +3,8 @@ class NotFoundException(Exception):
 
 
 class MissingDataException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class InvalidDataException(Exception):
+    pass
@@ -0,0 +1,54 @@
+import csv
+import io
+
+from flask import current_app
+from sqlalchemy import select
+
+from backend.tables import db, Question
+
+EXPORT_FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+EXPORT_YIELD_PER = 1000
+
+"""
+export_questions(file_format, category, yield_per)
+    generator of serialized chunks of the question bank, one chunk per yield_per rows.
+    rows are read through a server-side cursor, so memory stays flat whatever the table size
+"""
+
+
+def _partitions(category, yield_per):
+    query = select(Question.id, Question.question, Question.answer, Question.category, Question.difficulty) \
+        .order_by(Question.id)
+    if category is not None:
+        query = query.where(Question.category == category)
+    result = db.session.execute(query.execution_options(yield_per=yield_per))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def _ndjson_chunks(category, yield_per):
+    for partition in _partitions(category, yield_per):
+        yield b''.join(current_app.json.dumps_bytes(dict(zip(EXPORT_FIELDS, row))) + b'\n' for row in partition)
+
+
+def _csv_chunks(category, yield_per):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for partition in _partitions(category, yield_per):
+        writer.writerows(partition)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # an empty export still gets its header
+        yield buffer.getvalue().encode('utf-8')
+
+
+def export_questions(file_format, category=None, yield_per=EXPORT_YIELD_PER):
+    if file_format == 'csv':
+        return _csv_chunks(category, yield_per)
+    return _ndjson_chunks(category, yield_per)
@@ -1,23 +1,98 @@
+import io
 import os
-import sys
 
-from flask import Flask, request, abort, jsonify, Response, json
-from flask_sqlalchemy import SQLAlchemy
+import click
+from sqlalchemy.exc import IntegrityError
+from flask import Flask, request, abort, jsonify, Response, current_app, stream_with_context
 from flask_cors import CORS
-import random
-
-from sqlalchemy import and_
 
 from backend.exceptions import *
-from backend.tables import setup_db, Question, Category, db
+from backend.tables import setup_db, init_db, upgrade_db, database_path, Question, db, category_cache, question_counter
+from backend.readmodel import question_page, questions_by_ids, category_questions, question_record
+from backend.search import question_search
+from backend.sampling import question_sampler
+from backend.importer import validate_question, import_questions, read_csv, read_ndjson, IMPORT_BATCH_SIZE
+from backend.group_commit import group_commit
+from backend.ratelimit import admission, rate_limited, retry_after_headers
+from backend.exporter import export_questions, EXPORT_YIELD_PER
+from backend.routing import read_only, remember_write
+from backend.http_cache import conditional, data_version, HTTP_CACHE_REVALIDATE_SECONDS
+from backend.json_provider import configure_json
+from backend.compression import compress_response, COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, \
+    COMPRESSION_BROTLI_QUALITY
+from backend.metrics import request_metrics, pool_metrics
+from backend.query_audit import init_query_audit, query_budget
+from backend.response_cache import response_cache, render_total_questions
+from backend.sessions import quiz_sessions, MemorySessionStore, QUIZ_SESSION_MAX, QUIZ_SESSION_TTL_SECONDS
 
 QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+MAX_BATCH_IDS = 1000
+
+
+"""
+get_page_limit()
+    page size requested through ?limit=, defaulting to QUESTIONS_PER_PAGE
+    and capped by the app's MAX_QUESTIONS_PER_PAGE
+"""
+
+
+def get_page_limit():
+    limit = request.args.get('limit', QUESTIONS_PER_PAGE, type=int)
+    if limit < 1:
+        raise InvalidDataException
+    return min(limit, current_app.config['MAX_QUESTIONS_PER_PAGE'])
+
+
+"""
+parse_question_ids(ids)
+    distinct integer ids from a list or a comma separated string, in request order.
+    raises MissingDataException when there are none and InvalidDataException when one
+    is not an integer or there are more than MAX_BATCH_IDS
+"""
+
+
+def parse_question_ids(ids):
+    if isinstance(ids, str):
+        ids = [question_id for question_id in ids.split(',') if question_id.strip()]
+    if not isinstance(ids, list) or len(ids) == 0:
+        raise MissingDataException
+    try:
+        ids = list(dict.fromkeys(int(question_id) for question_id in ids))
+    except (TypeError, ValueError):
+        raise InvalidDataException
+    if len(ids) > current_app.config['MAX_BATCH_IDS']:
+        raise InvalidDataException
+    return ids
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    configure_json(app)
+    app.config.setdefault('MAX_QUESTIONS_PER_PAGE', MAX_QUESTIONS_PER_PAGE)
+    app.config.setdefault('MAX_BATCH_IDS', MAX_BATCH_IDS)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    request_metrics.init_app(app)
+    init_query_audit(app)
+    question_sampler.refresh_interval = app.config['QUESTION_COUNT_RECONCILE_SECONDS']
+    app.config.setdefault('HTTP_CACHE_REVALIDATE_SECONDS', HTTP_CACHE_REVALIDATE_SECONDS)
+    data_version.revalidate_seconds = app.config['HTTP_CACHE_REVALIDATE_SECONDS']
+    app.config.setdefault('IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+    app.config.setdefault('EXPORT_YIELD_PER', EXPORT_YIELD_PER)
+    app.config.setdefault('QUIZ_SESSION_MAX', QUIZ_SESSION_MAX)
+    app.config.setdefault('QUIZ_SESSION_TTL_SECONDS', QUIZ_SESSION_TTL_SECONDS)
+    quiz_sessions.store = app.config.get('QUIZ_SESSION_STORE') or \
+        MemorySessionStore(app.config['QUIZ_SESSION_MAX'], app.config['QUIZ_SESSION_TTL_SECONDS'])
+    question_search.configure(app)
+    response_cache.configure(app)
+    group_commit.configure(app)
+    admission.configure(app)
+    if app.config['DB_CREATE_ALL']:
+        with app.app_context():
+            question_search.prepare()
 
     """
     @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -33,6 +108,14 @@ def create_app(test_config=None):
         response.headers.add('Access-Control-Allow-Headers', 'GET, POST, PATCH, DELETE, OPTIONS')
         return response
 
+    if app.config['SQLALCHEMY_REPLICA_URI']:
+        app.after_request(remember_write)
+
+    app.config.setdefault('COMPRESSION_MIN_BYTES', COMPRESSION_MIN_BYTES)
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', COMPRESSION_GZIP_LEVEL)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', COMPRESSION_BROTLI_QUALITY)
+    app.after_request(compress_response)
+
     """
     @TODO:
     Create an endpoint to handle GET requests
@@ -40,17 +123,22 @@ def create_app(test_config=None):
     """
 
     @app.route('/categories', methods=['GET'])
+    @read_only
+    @conditional
+    @query_budget(1)
     def get_categories():
         try:
-            categories = Category.query.order_by(Category.id).all()
+            body = response_cache.get('categories')
+            if body is None:
+                generation = response_cache.generation
+                categories = category_cache.all()
 
-            if len(categories) == 0:
-                raise NotFoundException
+                if len(categories) == 0:
+                    raise NotFoundException
 
-            res = jsonify({'categories': {
-                category.id: category.type for category in categories
-            }})
-            return res
+                body = app.json.dumps_bytes({'categories': categories})
+                response_cache.set('categories', body, ['categories'], generation=generation)
+            return Response(body, content_type='application/json')
         except NotFoundException:
             abort(404)
         except Exception as e:
@@ -70,30 +158,61 @@ def create_app(test_config=None):
     """
 
     @app.route('/questions', methods=['GET'])
+    @rate_limited(1)
+    @read_only
+    @conditional
+    @query_budget(3)
     def get_questions():
+        if 'ids' in request.args:
+            return get_questions_by_id(request.args['ids'])
         try:
+            limit = get_page_limit()
+            after = request.args.get('after', None, type=int)
             page = request.args.get('page', 1, type=int)
-            start = (page - 1) * QUESTIONS_PER_PAGE
-            end = start + QUESTIONS_PER_PAGE
-            questions = Question.query.order_by(Question.id).offset(start).limit(QUESTIONS_PER_PAGE).all()
-            if len(questions) == 0:
-                raise NotFoundException
-            questions_format = [question.format() for question in questions]
-            total_questions = Question.query.count()
-            current_category_id = questions[0].category
-            current_category_string = Category.query.get(current_category_id).type
-            categories = Category.query.order_by(Category.id).all()
-            categories_format = [category.format() for category in categories]
-            response_data = {
-                'questions': questions_format,
-                'totalQuestions': total_questions,
-                'categories': categories_format,
-                'currentCategory': current_category_string
-            }
-            response = Response(json.dumps(response_data, sort_keys=False), content_type='application/json')
-            return response
+            if after is not None:
+                cache_key = 'questions?after={}&limit={}'.format(after, limit)
+            else:
+                cache_key = 'questions?page={}&limit={}'.format(page, limit)
+            body = response_cache.get(cache_key)
+            if body is None:
+                generation = response_cache.generation
+                questions = question_page(limit, after=after, offset=(page - 1) * limit)
+                if len(questions) == 0:
+                    raise NotFoundException
+                current_category_id = questions[0].category
+                current_category_string = category_cache.get(current_category_id)
+                categories_format = category_cache.format()
+                response_data = {
+                    'questions': questions,
+                    'categories': categories_format,
+                    'currentCategory': current_category_string
+                }
+                if after is not None:
+                    response_data['nextCursor'] = questions[-1].id if len(questions) == limit else None
+                body = app.json.dumps_bytes(response_data)
+                # a short page is the end of the listing, the only page a new question lands on
+                tags = ['questions', 'categories'] + (['questions:last'] if len(questions) < limit else [])
+                response_cache.set(cache_key, body, tags, upper=questions[-1].id, generation=generation)
+            body = render_total_questions(body, question_counter.total())
+            return Response(body, content_type='application/json')
         except NotFoundException:
             abort(404)
+        except InvalidDataException:
+            abort(422)
+        except Exception as e:
+            abort(500)
+
+    def get_questions_by_id(ids):
+        try:
+            ids = parse_question_ids(ids)
+            questions_by_id = {question.id: question for question in questions_by_ids(ids)}
+            return jsonify({
+                'questions': [questions_by_id[question_id] for question_id in ids if question_id in questions_by_id],
+                'found': [question_id for question_id in ids if question_id in questions_by_id],
+                'missing': [question_id for question_id in ids if question_id not in questions_by_id]
+            })
+        except (MissingDataException, InvalidDataException):
+            abort(422)
         except Exception as e:
             abort(500)
 
@@ -106,27 +225,38 @@ def create_app(test_config=None):
     """
 
     @app.route('/questions/delete/<int:question_id>', methods=['DELETE'])
+    @query_budget(2)
     def delete_question(question_id):
-        error = False
         try:
             this_question = Question.query.get(question_id)
             if this_question is None:
                 raise NotFoundException
             this_question.delete()
+            return jsonify({
+                'deletedQuestion': question_id
+            })
         except NotFoundException:
             abort(404)
         except Exception as e:
-            error = True
             db.session.rollback()
-            print(sys.exc_info())
-        finally:
-            db.session.close()
-        if error:
             abort(500)
-        else:
+
+    @app.route('/questions/batch-delete', methods=['POST'])
+    @query_budget(1)
+    def batch_delete_questions():
+        try:
+            body = request.get_json()
+            ids = parse_question_ids(body.get('ids', None))
+            deleted = {question['id'] for question in Question.delete_many(ids)}
             return jsonify({
-                'deletedQuestion': question_id
+                'deleted': [question_id for question_id in ids if question_id in deleted],
+                'missing': [question_id for question_id in ids if question_id not in deleted]
             })
+        except (MissingDataException, InvalidDataException):
+            abort(422)
+        except Exception as e:
+            db.session.rollback()
+            abort(500)
 
     """
     @TODO:
@@ -140,30 +270,39 @@ def create_app(test_config=None):
     """
 
     @app.route('/questions/search', methods=['POST'])
+    @rate_limited(5)
+    @read_only
+    @query_budget(4)
     def search_question():
         try:
             body = request.get_json()
             search_term = body.get('searchTerm', None)
             if search_term is None:
                 raise MissingDataException
-            fetched_questions = Question.query.filter(Question.question.like(f'%{search_term}%')).all()
+            try:
+                limit = min(int(body.get('limit', app.config['SEARCH_RESULT_LIMIT'])),
+                            app.config['SEARCH_RESULT_LIMIT'])
+            except (TypeError, ValueError):
+                raise InvalidDataException
+            if limit < 1:
+                raise InvalidDataException
+            # a number or other JSON scalar is searched for as its text
+            fetched_questions = question_search.search(str(search_term), limit)
             if len(fetched_questions) == 0:
                 raise NotFoundException()
             current_category_id = fetched_questions[0].category
-            current_category_string = Category.query.get(current_category_id).type
-            fetched_questions_format = [question.format() for question in fetched_questions]
-            total_questions = Question.query.count()
+            current_category_string = category_cache.get(current_category_id)
+            total_questions = question_counter.total()
             response_data = \
             {
-                'questions': fetched_questions_format,
+                'questions': fetched_questions,
                 'totalQuestions': total_questions,
                 'currentCategory': current_category_string
             }
-            response = Response(json.dumps(response_data, sort_keys=False), content_type='application/json')
-            return response
+            return jsonify(response_data)
         except NotFoundException:
             abort(404)
-        except MissingDataException:
+        except (MissingDataException, InvalidDataException):
             abort(422)
         except Exception as e:
             abort(500)
@@ -180,42 +319,136 @@ def create_app(test_config=None):
     """
 
     @app.route('/questions', methods=['POST'])
+    @query_budget(2)
     def create_question():
-        error = False
         try:
             body = request.get_json()
-            question = body.get('question', None)
-            answer = body.get('answer', None)
-            category = body.get('category', None)
-            difficulty = body.get('difficulty', None)
-            if question is None or answer is None or category is None or difficulty is None:
-                raise MissingDataException
-            if difficulty is not None:
-                difficulty = int(difficulty)
-            if category is not None:
-                category = int(category)
-            new_question = Question(question=question, answer=answer, category=category, difficulty=difficulty)
-            new_question.insert()
+            record = validate_question(body)
+            question = record['question']
+            answer = record['answer']
+            category = record['category']
+            difficulty = record['difficulty']
+            if app.config['GROUP_COMMIT_ENABLED']:
+                # committed together with the other requests' questions of the next few milliseconds
+                question_id = group_commit.insert(record)
+            else:
+                new_question = Question(question=question, answer=answer, category=category, difficulty=difficulty)
+                new_question.insert()
+                question_id = new_question.id
         except MissingDataException:
             abort(422)
+        except IntegrityError:
+            # the questions.category foreign key rejects unknown categories
+            db.session.rollback()
+            abort(422)
         except Exception as e:
-            error = True
             db.session.rollback()
-            print(sys.exc_info())
-        finally:
-            db.session.close()
-        if error:
             abort(500)
-        else:
-            response_data = \
-             {
-                'newQuestionQuestion': question,
-                'newQuestionAnswer': answer,
-                'newQuestionCategory': str(category),
-                'newQuestionDifficulty': str(difficulty)
-            }
-            response = Response(json.dumps(response_data, sort_keys=False), content_type='application/json')
+        response_data = \
+         {
+            'newQuestionId': question_id,
+            'newQuestionQuestion': question,
+            'newQuestionAnswer': answer,
+            'newQuestionCategory': str(category),
+            'newQuestionDifficulty': str(difficulty)
+        }
+        return jsonify(response_data)
+
+    @app.route('/questions/bulk', methods=['POST'])
+    @rate_limited(10)
+    def bulk_create_questions():
+        try:
+            batch_size = request.args.get('batchSize', app.config['IMPORT_BATCH_SIZE'], type=int)
+            if batch_size < 1:
+                raise InvalidDataException
+            if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+                # read the body line by line instead of buffering the whole upload
+                records = read_ndjson(request.stream)
+            else:
+                body = request.get_json()
+                if not isinstance(body, list):
+                    raise MissingDataException
+                records = enumerate(body, start=1)
+            report = import_questions(records, batch_size)
+            return jsonify(report)
+        except (MissingDataException, InvalidDataException):
+            abort(422)
+        except Exception as e:
+            abort(500)
+
+    @app.route('/questions/export', methods=['GET'])
+    @rate_limited(10)
+    @read_only
+    def export_question_bank():
+        try:
+            file_format = request.args.get('format', 'ndjson')
+            if file_format not in ('ndjson', 'csv'):
+                raise InvalidDataException
+            category = request.args.get('category', None, type=int)
+            if category is not None and category_cache.get(category) is None:
+                raise NotFoundException
+            chunks = export_questions(file_format, category, app.config['EXPORT_YIELD_PER'])
+            mimetype = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+            response = Response(stream_with_context(chunks), mimetype=mimetype)
+            response.headers['Content-Disposition'] = 'attachment; filename=questions.' + file_format
             return response
+        except NotFoundException:
+            abort(404)
+        except InvalidDataException:
+            abort(422)
+        except Exception as e:
+            abort(500)
+
+    @app.route('/stats/pool', methods=['GET'])
+    def get_pool_stats():
+        stats = app.extensions['pool_stats'].format()
+        if 'replica_pool_stats' in app.extensions:
+            stats['replica'] = app.extensions['replica_pool_stats'].format()
+        stats['pid'] = os.getpid()
+        return jsonify(stats)
+
+    @app.route('/stats/cache', methods=['GET'])
+    def get_cache_stats():
+        return jsonify(response_cache.format())
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        extra = pool_metrics(app.extensions['pool_stats'], 'trivia_db_pool')
+        if 'replica_pool_stats' in app.extensions:
+            extra += pool_metrics(app.extensions['replica_pool_stats'], 'trivia_db_replica_pool')
+        return Response(request_metrics.expose(extra), mimetype='text/plain; version=0.0.4')
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the tables and search indexes."""
+        init_db(app)
+        with app.app_context():
+            question_search.prepare()
+        click.echo('initialized the database')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Apply the pending schema migrations."""
+        applied = upgrade_db(app)
+        click.echo('applied migrations {}'.format(applied) if applied else 'the database is up to date')
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), default=None,
+                  help='Input format, guessed from the file extension when omitted.')
+    @click.option('--batch-size', type=click.IntRange(min=1), default=None,
+                  help='Rows per transaction, defaults to IMPORT_BATCH_SIZE.')
+    def import_questions_command(path, file_format, batch_size):
+        """Bulk load questions from a CSV or NDJSON file."""
+        if file_format is None:
+            file_format = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+        with io.open(path, encoding='utf-8', newline='') as f:
+            records = read_csv(f) if file_format == 'csv' else read_ndjson(f)
+            report = import_questions(records, batch_size or app.config['IMPORT_BATCH_SIZE'])
+        for batch in report['batches']:
+            for batch_error in batch['errors']:
+                click.echo('batch {}: {}'.format(batch['batch'], batch_error), err=True)
+        click.echo('inserted {} questions, {} failed'.format(report['inserted'], report['failed']))
 
     """
     @TODO:
@@ -227,23 +460,43 @@ def create_app(test_config=None):
     """
 
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    @rate_limited(1)
+    @read_only
+    @conditional
+    @query_budget(3)
     def get_category_questions(category_id):
         try:
-            if Category.query.get(category_id) is None:
+            if category_cache.get(category_id) is None:
                 raise NotFoundException
-            questions = Question.query.filter_by(category=category_id).all()
-            questions_format = [question.format() for question in questions]
-            total_questions = Question.query.count()
-            current_category_string = Category.query.get(category_id).type
-            response_data = {
-                'questions': questions_format,
-                'totalQuestions': total_questions,
-                'currentCategory': current_category_string
-            }
-            response = Response(json.dumps(response_data, sort_keys=False), content_type='application/json')
-            return response
+            if request.args.get('stream', '').lower() in ('1', 'true'):
+                chunks = export_questions('ndjson', category_id, app.config['EXPORT_YIELD_PER'])
+                return Response(stream_with_context(chunks), mimetype='application/x-ndjson')
+            limit = get_page_limit()
+            after = request.args.get('after', None, type=int)
+            page = request.args.get('page', 1, type=int)
+            if after is not None:
+                cache_key = 'categories/{}/questions?after={}&limit={}'.format(category_id, after, limit)
+            else:
+                cache_key = 'categories/{}/questions?page={}&limit={}'.format(category_id, page, limit)
+            body = response_cache.get(cache_key)
+            if body is None:
+                generation = response_cache.generation
+                current_category_string = category_cache.get(category_id)
+                questions = category_questions(category_id, limit, after=after, offset=(page - 1) * limit)
+                response_data = {
+                    'questions': questions,
+                    'currentCategory': current_category_string,
+                    'nextCursor': questions[-1].id if len(questions) == limit else None
+                }
+                body = app.json.dumps_bytes(response_data)
+                tags = ['category', 'category:{}'.format(category_id), 'categories']
+                response_cache.set(cache_key, body, tags, generation=generation)
+            body = render_total_questions(body, question_counter.total())
+            return Response(body, content_type='application/json')
         except NotFoundException:
             abort(404)
+        except InvalidDataException:
+            abort(422)
         except Exception as e:
             abort(500)
 
@@ -259,25 +512,61 @@ def create_app(test_config=None):
     and shown whether they were correct or not.
     """
 
+    @app.route('/quizzes/sessions', methods=['POST'])
+    @rate_limited(2)
+    @read_only
+    @query_budget(3)
+    def start_quiz_session():
+        try:
+            body = request.get_json()
+            quiz_category = body.get('quizCategory', None)
+            if quiz_category is None:
+                raise MissingDataException
+            quiz_category = int(quiz_category)
+            if category_cache.get(quiz_category) is None:
+                raise NotFoundException
+            session_token, total_questions = quiz_sessions.start(quiz_category,
+                                                                 question_sampler.category_ids(quiz_category))
+            return jsonify({
+                'sessionToken': session_token,
+                'quizCategory': quiz_category,
+                'totalQuestions': total_questions
+            })
+        except NotFoundException:
+            abort(404)
+        except MissingDataException:
+            abort(422)
+        except Exception as e:
+            abort(500)
+
     @app.route('/quizzes', methods=['POST'])
+    @rate_limited(2)
+    @read_only
+    @query_budget(4)
     def get_next_question():
         try:
             body = request.get_json()
+            session_token = body.get('sessionToken', None)
+            if session_token is not None:
+                return get_next_session_question(session_token)
             quiz_category = body.get('quizCategory', None)
             if quiz_category is None:
                 raise MissingDataException
             if quiz_category is not None:
                 quiz_category = int(quiz_category)
-            if Category.query.get(quiz_category) is None:
+            if category_cache.get(quiz_category) is None:
                 raise NotFoundException
-            previous_questions = body.get('previousQuestions', [])
-            previous_questions_int = [int(question) for question in previous_questions]
-            possible_questions = Question.query.filter(and_(Question.category == quiz_category,
-                                                            Question.id.notin_(previous_questions))).all()
-            if len(possible_questions) == 0:
-                raise NotFoundException
-            next_question = random.choice(possible_questions)
-            next_question = next_question.format()
+            previous_questions = body.get('previousQuestions', None) or []
+            previous_questions_int = {int(question) for question in previous_questions}
+            next_question = None
+            while next_question is None:
+                question_id = question_sampler.pick(quiz_category, previous_questions_int)
+                if question_id is None:
+                    raise NotFoundException
+                next_question = question_record(question_id)
+                if next_question is None:
+                    # deleted by another worker since the ids were cached
+                    question_sampler.discard(quiz_category, question_id)
             return jsonify({
                 'question': next_question
             })
@@ -288,6 +577,21 @@ def create_app(test_config=None):
         except Exception as e:
             abort(500)
 
+    def get_next_session_question(session_token):
+        next_question = None
+        while next_question is None:
+            try:
+                quiz_category, question_id = quiz_sessions.next(session_token)
+            except KeyError:
+                raise NotFoundException
+            if question_id is None:
+                raise NotFoundException
+            # questions deleted after the deck was dealt are skipped
+            next_question = question_record(question_id)
+        return jsonify({
+            'question': next_question
+        })
+
     """
     @TODO:
     Create error handlers for all expected errors
@@ -326,8 +630,29 @@ def create_app(test_config=None):
             "message": "Unable to process request"
         }), 422
 
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        return jsonify({
+            "success": False,
+            "error": 429,
+            "message": "Too Many Requests"
+        }), 429, retry_after_headers(error)
+
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        return jsonify({
+            "success": False,
+            "error": 503,
+            "message": "Service Unavailable"
+        }), 503, retry_after_headers(error)
+
     @app.errorhandler(500)
     def internal_server_error(error):
+        # routes turn unexpected exceptions into abort(500), which keeps them as the context
+        exception = getattr(error, 'original_exception', None) or error.__context__
+        if exception is not None:
+            app.logger.error('%s %s failed', request.method, request.path, exc_info=exception)
+            request_metrics.record_exception(exception)
         return jsonify({
             "success": False,
             "error": 500,
@@ -335,6 +660,3 @@ def create_app(test_config=None):
         }), 500
 
     return app
-
-
-create_app()
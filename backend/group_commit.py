@@ -0,0 +1,130 @@
+import concurrent.futures
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.importer import _insert_batch
+from backend.tables import db
+
+GROUP_COMMIT_ENABLED = False
+GROUP_COMMIT_MAX_ROWS = 100
+GROUP_COMMIT_MAX_DELAY_MS = 5
+GROUP_COMMIT_TIMEOUT_SECONDS = 30
+
+"""
+GroupCommitWriter
+    coalesces question inserts from concurrent requests into one transaction. a background
+    thread takes the first queued row, waits up to GROUP_COMMIT_MAX_DELAY_MS for more (at most
+    GROUP_COMMIT_MAX_ROWS) and inserts them with one executemany and one commit. every caller
+    waits on its own Future for the assigned id; when the batch fails its rows are retried one
+    per transaction, so a bad row fails only its own request
+"""
+
+
+class GroupCommitWriter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._app = None
+        self.max_rows = GROUP_COMMIT_MAX_ROWS
+        self.max_delay = GROUP_COMMIT_MAX_DELAY_MS / 1000
+
+    def configure(self, app):
+        app.config.setdefault('GROUP_COMMIT_ENABLED', GROUP_COMMIT_ENABLED)
+        app.config.setdefault('GROUP_COMMIT_MAX_ROWS', GROUP_COMMIT_MAX_ROWS)
+        app.config.setdefault('GROUP_COMMIT_MAX_DELAY_MS', GROUP_COMMIT_MAX_DELAY_MS)
+        self.close()
+        self._app = app
+        self.max_rows = app.config['GROUP_COMMIT_MAX_ROWS']
+        self.max_delay = app.config['GROUP_COMMIT_MAX_DELAY_MS'] / 1000
+
+    def submit(self, row):
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(self._app, self._queue),
+                                                name='group-commit', daemon=True)
+                self._thread.start()
+            self._queue.put((row, future))
+        return future
+
+    """
+    insert(row)
+        queues a validated question row and returns its id once the batch holding it is
+        committed. raises the row's own database error
+    """
+
+    def insert(self, row):
+        future = self.submit(row)
+        try:
+            return future.result(GROUP_COMMIT_TIMEOUT_SECONDS)
+        except concurrent.futures.TimeoutError:
+            # drops the row unless its batch is being written already
+            future.cancel()
+            raise
+
+    def close(self):
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+            self._thread = None
+            self._queue = queue.Queue()
+        thread.join()
+
+    def _run(self, app, rows):
+        stopping = False
+        while not stopping:
+            item = rows.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = rows.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            # requests that gave up waiting cancelled their Future, their rows are dropped
+            batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                with app.app_context():
+                    self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            ids = _insert_batch([row for row, _ in batch])
+        except SQLAlchemyError:
+            db.session.rollback()
+            for row, future in batch:
+                self._commit_one(row, future)
+        except Exception as e:
+            # not a database error, the rows may be committed already and are not retried
+            db.session.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), question_id in zip(batch, ids):
+                future.set_result(question_id)
+
+    def _commit_one(self, row, future):
+        try:
+            future.set_result(_insert_batch([row])[0])
+        except Exception as e:
+            db.session.rollback()
+            future.set_exception(e)
+
+
+group_commit = GroupCommitWriter()
@@ -0,0 +1,91 @@
+import functools
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, request
+
+from backend.tables import category_cache, category_listeners, question_listeners
+
+HTTP_CACHE_MAX_AGE = 0
+HTTP_CACHE_REVALIDATE_SECONDS = 60
+
+"""
+DataVersion
+    stamp of the data this worker has served, advanced by every question write seen through
+    question_listeners and every category write seen through category_listeners (the ETag
+    takes categories from category_cache.version).
+    other workers' writes are not seen here, so the stamp also rolls over every
+    revalidate_seconds; that bounds how long another worker's write can hide behind a 304
+"""
+
+
+class DataVersion:
+
+    def __init__(self, revalidate_seconds=HTTP_CACHE_REVALIDATE_SECONDS):
+        self._lock = threading.Lock()
+        self._boot = uuid.uuid4().hex[:8]
+        self._questions = 0
+        self._changed_at = time.time()
+        self.revalidate_seconds = revalidate_seconds
+
+    def question_changed(self, action, questions):
+        with self._lock:
+            self._questions += 1
+            self._changed_at = time.time()
+
+    def category_changed(self):
+        with self._lock:
+            self._changed_at = time.time()
+
+    def _window(self, now):
+        return int(now // self.revalidate_seconds) if self.revalidate_seconds > 0 else 0
+
+    def etag(self):
+        return '{}-{}-{}-{}'.format(self._boot, self._questions, category_cache.version, self._window(time.time()))
+
+    def last_modified(self):
+        now = time.time()
+        window_start = self._window(now) * self.revalidate_seconds if self.revalidate_seconds > 0 else 0
+        return datetime.fromtimestamp(int(max(self._changed_at, window_start)), timezone.utc)
+
+
+data_version = DataVersion()
+question_listeners.append(data_version.question_changed)
+category_listeners.append(data_version.category_changed)
+
+"""
+conditional
+    answers GET requests carrying a matching If-None-Match (or a current If-Modified-Since)
+    with 304 before the route runs, and stamps 200 responses with ETag, Last-Modified and
+    Cache-Control (no-cache, or max-age=HTTP_CACHE_MAX_AGE when it is set)
+"""
+
+
+def conditional(route):
+
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        etag = data_version.etag()
+        last_modified = data_version.last_modified()
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = request.if_modified_since is not None and request.if_modified_since >= last_modified
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(route(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        max_age = current_app.config.get('HTTP_CACHE_MAX_AGE', HTTP_CACHE_MAX_AGE)
+        if max_age:
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    return wrapper
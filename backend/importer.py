@@ -0,0 +1,111 @@
+import csv
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.exceptions import MissingDataException
+from backend.tables import db, Question, questions_changed
+
+IMPORT_BATCH_SIZE = 1000
+
+"""
+validate_question(record)
+    checks a question record the way POST /questions does and returns the row to insert.
+    raises MissingDataException when a field is missing and ValueError when
+    category or difficulty is not an integer
+"""
+
+
+def validate_question(record):
+    question = record.get('question', None)
+    answer = record.get('answer', None)
+    category = record.get('category', None)
+    difficulty = record.get('difficulty', None)
+    if question is None or answer is None or category is None or difficulty is None:
+        raise MissingDataException
+    return {
+        'question': question,
+        'answer': answer,
+        'category': int(category),
+        'difficulty': int(difficulty)
+    }
+
+
+"""
+read_ndjson(lines) / read_csv(lines)
+    lazily parse an iterable of text lines into (line number, record) pairs.
+    a line that is not valid JSON yields its ValueError as the record
+"""
+
+
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            yield line_number, current_app.json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+
+
+def read_csv(lines):
+    for line_number, record in enumerate(csv.DictReader(lines), start=2):
+        yield line_number, record
+
+
+def _insert_batch(rows):
+    result = db.session.execute(insert(Question).returning(Question.id, sort_by_parameter_order=True), rows)
+    ids = result.scalars().all()
+    db.session.commit()
+    questions = [dict(row, id=question_id) for row, question_id in zip(rows, ids)]
+    questions_changed('insert', questions)
+    return ids
+
+
+"""
+import_questions(records, batch_size)
+    validates (line number, record) pairs and inserts the valid ones batch_size rows per transaction
+    with a single executemany. invalid records and failed batches are reported, not raised,
+    so one bad batch does not abort the load
+"""
+
+
+def import_questions(records, batch_size=IMPORT_BATCH_SIZE):
+    report = {'inserted': 0, 'failed': 0, 'batches': []}
+
+    def flush(rows, errors):
+        batch = {'batch': len(report['batches']) + 1, 'inserted': 0, 'errors': errors}
+        if rows:
+            try:
+                batch['inserted'] = len(_insert_batch([row for _, row in rows]))
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                batch['errors'].append({'lines': [line for line, _ in rows],
+                                        'error': str(getattr(e, 'orig', None) or e)})
+                report['failed'] += len(rows)
+        report['inserted'] += batch['inserted']
+        report['batches'].append(batch)
+
+    rows = []
+    errors = []
+    for line, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            rows.append((line, validate_question(record)))
+        except MissingDataException:
+            errors.append({'line': line, 'error': 'missing question, answer, category or difficulty'})
+            report['failed'] += 1
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append({'line': line, 'error': str(e) or type(e).__name__})
+            report['failed'] += 1
+        if len(rows) >= batch_size:
+            flush(rows, errors)
+            rows = []
+            errors = []
+    if rows or errors:
+        flush(rows, errors)
+    return report
@@ -0,0 +1,203 @@
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from backend.tables import db
+
+SERVER_TIMING = False
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+"""
+Histogram(name, help, labels, buckets)
+    Prometheus histogram: per label set, cumulative bucket counts, a sum and a count
+"""
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels, buckets):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, (bucket_counts, total, count) in series:
+            labels = _labels(self.labels, label_values)
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append('{}_bucket{{{}}} {}'.format(self.name, _join(labels, 'le="{}"'.format(bound)), bucket_count))
+            lines.append('{}_bucket{{{}}} {}'.format(self.name, _join(labels, 'le="+Inf"'), count))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, labels, round(total, 6)))
+            lines.append('{}_count{{{}}} {}'.format(self.name, labels, count))
+        return lines
+
+
+"""
+Counter(name, help, labels)
+    Prometheus counter per label set
+"""
+
+
+class Counter:
+
+    def __init__(self, name, help, labels):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def expose(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} counter'.format(self.name)]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            lines.append('{}{{{}}} {}'.format(self.name, _labels(self.labels, label_values), value))
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values))
+
+
+def _join(*parts):
+    return ','.join(part for part in parts if part)
+
+
+def _sample(name, help, value, metric_type='gauge'):
+    return ['# HELP {} {}'.format(name, help), '# TYPE {} {}'.format(name, metric_type), '{} {}'.format(name, value)]
+
+
+"""
+RequestMetrics
+    per-request wall time, SQL statement count and SQL time (counted by engine events on every
+    engine of the app) and response size, kept as histograms per route and exposed in the
+    Prometheus text format. exceptions that routes turn into a 500 are counted by type
+"""
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.duration = Histogram('trivia_request_duration_seconds', 'Wall time of a request.',
+                                  ('method', 'route', 'status'), DURATION_BUCKETS)
+        self.statements = Histogram('trivia_request_sql_statements', 'SQL statements issued by a request.',
+                                    ('method', 'route'), STATEMENT_BUCKETS)
+        self.sql_time = Histogram('trivia_request_sql_seconds', 'Time a request spent executing SQL.',
+                                  ('method', 'route'), DURATION_BUCKETS)
+        self.size = Histogram('trivia_response_bytes', 'Size of a buffered response body as sent.',
+                              ('method', 'route'), SIZE_BUCKETS)
+        self.exceptions = Counter('trivia_request_exceptions_total', 'Exceptions turned into a 500 response.',
+                                  ('method', 'route', 'exception'))
+
+    def init_app(self, app):
+        self.reset()
+        app.config.setdefault('SERVER_TIMING', SERVER_TIMING)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+                event.listen(engine, 'handle_error', _handle_error)
+        app.before_request(_start_request)
+        app.after_request(self.record)
+
+    def record(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        route = _route()
+        duration = time.perf_counter() - started
+        self.duration.observe(duration, request.method, route, response.status_code)
+        self.statements.observe(g.sql_statements, request.method, route)
+        self.sql_time.observe(g.sql_seconds, request.method, route)
+        if not response.is_streamed:
+            self.size.observe(response.calculate_content_length() or 0, request.method, route)
+        if current_app.config['SERVER_TIMING']:
+            response.headers.add('Server-Timing', 'app;dur={:.3f}'.format(duration * 1000))
+            response.headers.add('Server-Timing', 'db;dur={:.3f};desc="{} statements"'.format(
+                g.sql_seconds * 1000, g.sql_statements))
+        return response
+
+    def record_exception(self, exception):
+        self.exceptions.inc(request.method, _route(), type(exception).__name__)
+
+    def expose(self, extra=()):
+        lines = []
+        for metric in (self.duration, self.statements, self.sql_time, self.size, self.exceptions):
+            lines.extend(metric.expose())
+        lines.extend(extra)
+        return '\n'.join(lines) + '\n'
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += time.perf_counter() - started
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+"""
+pool_metrics(stats, prefix)
+    exposition lines for the checkout counters of a PoolStats
+"""
+
+
+def pool_metrics(stats, prefix):
+    pool = stats.format()
+    return _sample(prefix + '_checked_out', 'Connections checked out of the pool.', pool['checkedOut']) + \
+        _sample(prefix + '_checkouts_total', 'Connection checkouts.', pool['checkouts'], 'counter') + \
+        _sample(prefix + '_waits_total', 'Checkouts that found the pool saturated.', pool['waits'], 'counter') + \
+        _sample(prefix + '_timeouts_total', 'Checkouts that timed out.', pool['timeouts'], 'counter')
+
+
+request_metrics = RequestMetrics()
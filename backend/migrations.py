@@ -0,0 +1,181 @@
+import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, func, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+# (version, description, upgrade(connection, metadata)) in version order, filled by @migration
+MIGRATIONS = []
+
+"""
+MigrationError
+    a migration that cannot be applied to the data as it is, e.g. rows that would violate a
+    new constraint. nothing of the failing migration is applied
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+"""
+migration(version, description)
+    registers upgrade(connection, metadata) as the step that brings the schema to `version`.
+    every step runs in its own transaction together with its schema_version row
+"""
+
+
+def migration(version, description):
+
+    def decorator(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return upgrade
+
+    return decorator
+
+
+def head():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(connection):
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar()
+
+
+def _record(connection, version, description):
+    connection.execute(insert(schema_version).values(version=version, description=description,
+                                                     applied_at=datetime.datetime.utcnow()))
+
+
+"""
+stamp(engine)
+    records every migration as applied, for a schema that create_all() just built from the models
+"""
+
+
+def stamp(engine):
+    with engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+        applied = current_version(connection)
+        for version, description, _ in MIGRATIONS:
+            if version > applied:
+                _record(connection, version, description)
+
+
+"""
+pending(engine)
+    the (version, description) of every migration newer than the database's schema_version
+"""
+
+
+def pending(engine):
+    with engine.connect() as connection:
+        applied = current_version(connection)
+    return [(version, description) for version, description, _ in MIGRATIONS if version > applied]
+
+
+"""
+upgrade(engine, metadata)
+    applies the migrations newer than the database's schema_version, in order, and returns
+    the versions applied. concurrent upgrades on Postgres wait on an advisory lock. on SQLite
+    the steps run with foreign keys off (dropping a rebuilt table would otherwise run its
+    ON DELETE actions) and are checked against them before they commit
+"""
+
+
+def upgrade(engine, metadata):
+    applied = []
+    with engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+    for version, description, step in MIGRATIONS:
+        with engine.connect() as connection:
+            sqlite = connection.dialect.name == 'sqlite'
+            if sqlite:
+                _sqlite_foreign_keys(connection, False)
+            try:
+                with connection.begin():
+                    if connection.dialect.name == 'postgresql':
+                        connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:name))'),
+                                           {'name': schema_version.name})
+                    if current_version(connection) >= version:
+                        continue
+                    step(connection, metadata)
+                    if sqlite and connection.exec_driver_sql('PRAGMA foreign_key_check').first() is not None:
+                        raise MigrationError('migration {} leaves rows that violate a foreign key'.format(version))
+                    _record(connection, version, description)
+                    applied.append(version)
+            finally:
+                if sqlite:
+                    _sqlite_foreign_keys(connection, True)
+    return applied
+
+
+def _sqlite_foreign_keys(connection, enabled):
+    # the pragma is ignored inside a transaction, so it runs and commits on its own
+    connection.exec_driver_sql('PRAGMA foreign_keys = {}'.format('ON' if enabled else 'OFF'))
+    connection.commit()
+    if connection.exec_driver_sql('PRAGMA foreign_keys').scalar() != int(enabled):
+        raise MigrationError('could not turn SQLite foreign keys {}'.format('on' if enabled else 'off'))
+    connection.commit()
+
+
+def _rebuild_sqlite_table(connection, table):
+    # SQLite cannot add constraints to a table, so it is rebuilt from the model definition
+    old_name = '_old_' + table.name
+    columns = ', '.join(column.name for column in table.columns)
+    connection.execute(text('ALTER TABLE {} RENAME TO {}'.format(table.name, old_name)))
+    connection.execute(CreateTable(table))
+    connection.execute(text('INSERT INTO {0} ({1}) SELECT {1} FROM {2}'.format(table.name, columns, old_name)))
+    connection.execute(text('DROP TABLE {}'.format(old_name)))
+    for index in table.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+@migration(1, 'questions (category, id) and (category, difficulty) indexes')
+def _category_indexes(connection, metadata):
+    for index in metadata.tables['questions'].indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+@migration(2, 'NOT NULL question columns and categories.type, questions.category foreign key')
+def _category_foreign_key(connection, metadata):
+    questions = metadata.tables['questions']
+    categories = metadata.tables['categories']
+    invalid = connection.execute(
+        select(func.count()).select_from(questions).where(
+            questions.c.question.is_(None) | questions.c.answer.is_(None) | questions.c.difficulty.is_(None) |
+            questions.c.category.is_(None) | questions.c.category.not_in(select(categories.c.id)))).scalar()
+    if invalid:
+        raise MigrationError('{} questions have an empty column or an unknown category, '
+                             'fix or delete them before upgrading'.format(invalid))
+    if connection.execute(select(func.count()).select_from(categories)
+                          .where(categories.c.type.is_(None))).scalar():
+        raise MigrationError('categories without a type, fix or delete them before upgrading')
+
+    if connection.dialect.name == 'sqlite':
+        _rebuild_sqlite_table(connection, categories)
+        _rebuild_sqlite_table(connection, questions)
+        return
+    if connection.dialect.name != 'postgresql':
+        raise MigrationError('no upgrade path for ' + connection.dialect.name)
+    # trivia.psql ships a foreign key named "category" with ON DELETE SET NULL, which NOT NULL rules out
+    for foreign_key in inspect(connection).get_foreign_keys('questions'):
+        if foreign_key['constrained_columns'] == ['category']:
+            connection.execute(text('ALTER TABLE questions DROP CONSTRAINT "{}"'.format(foreign_key['name'])))
+    connection.execute(text('ALTER TABLE categories ALTER COLUMN type SET NOT NULL'))
+    connection.execute(text('ALTER TABLE questions ALTER COLUMN question SET NOT NULL, '
+                            'ALTER COLUMN answer SET NOT NULL, ALTER COLUMN category SET NOT NULL, '
+                            'ALTER COLUMN difficulty SET NOT NULL'))
+    foreign_key = next(iter(questions.c.category.foreign_keys))
+    connection.execute(text('ALTER TABLE questions ADD CONSTRAINT {} FOREIGN KEY (category) '
+                            'REFERENCES categories (id) ON DELETE {}'.format(foreign_key.name,
+                                                                             foreign_key.ondelete)))
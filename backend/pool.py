@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = -1
+DB_POOL_PRE_PING = False
+
+"""
+PoolStats
+    checkout counters for one connection pool: how many checkouts there were, how many found
+    the pool saturated and had to wait, how many timed out and how long checkouts took
+"""
+
+
+class PoolStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pool = None
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+
+    def record(self, seconds, waited, timed_out):
+        with self._lock:
+            self.checkouts += 1
+            self.waits += waited
+            self.timeouts += timed_out
+            self.checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+
+    def format(self):
+        pool = self.pool
+        return {
+            'size': pool.size() if pool is not None else 0,
+            'checkedOut': pool.checkedout() if pool is not None else 0,
+            'overflow': pool.overflow() if pool is not None else 0,
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'timeouts': self.timeouts,
+            'checkoutSecondsTotal': round(self.checkout_seconds, 6),
+            'checkoutSecondsMax': round(self.max_checkout_seconds, 6)
+        }
+
+
+"""
+instrumented_pool(stats)
+    QueuePool subclass that times every checkout into stats.
+    the subclass keeps stats across pool.recreate(), which rebuilds the pool from its class
+"""
+
+
+def instrumented_pool(stats):
+
+    class InstrumentedQueuePool(QueuePool):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            stats.pool = self
+
+        def connect(self):
+            waited = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+            timed_out = False
+            started = time.perf_counter()
+            try:
+                return super().connect()
+            except exc.TimeoutError:
+                timed_out = True
+                raise
+            finally:
+                stats.record(time.perf_counter() - started, waited, timed_out)
+
+    return InstrumentedQueuePool
+
+
+def _config_value(app, key, default, cast):
+    value = app.config.get(key, os.getenv(key))
+    if value is None:
+        return default
+    if cast is bool and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return cast(value)
+
+
+"""
+pool_options(app, database_uri, stats)
+    engine options for database_uri built from the DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE and DB_POOL_PRE_PING app config values or environment variables.
+    in-memory SQLite keeps SQLAlchemy's single connection pool and gets no options
+"""
+
+
+def pool_options(app, database_uri, stats):
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'poolclass': instrumented_pool(stats),
+        'pool_size': _config_value(app, 'DB_POOL_SIZE', DB_POOL_SIZE, int),
+        'max_overflow': _config_value(app, 'DB_MAX_OVERFLOW', DB_MAX_OVERFLOW, int),
+        'pool_timeout': _config_value(app, 'DB_POOL_TIMEOUT', DB_POOL_TIMEOUT, int),
+        'pool_recycle': _config_value(app, 'DB_POOL_RECYCLE', DB_POOL_RECYCLE, int),
+        'pool_pre_ping': _config_value(app, 'DB_POOL_PRE_PING', DB_POOL_PRE_PING, bool)
+    }
@@ -0,0 +1,140 @@
+import collections
+import functools
+import logging
+import re
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+from backend.tables import db
+
+QUERY_AUDIT = False
+QUERY_BUDGET_STRICT = False
+SLOW_QUERY_SECONDS = 0.25
+N_PLUS_ONE_THRESHOLD = 5
+SLOW_QUERY_PARAMETERS_LENGTH = 200
+
+logger = logging.getLogger('backend.query_audit')
+
+_PARAMETER_LISTS = re.compile(r'(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+))+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+"""
+QueryBudgetExceeded
+    raised after a request that issued more statements than its route's query_budget, or the
+    same statement shape N_PLUS_ONE_THRESHOLD times, when QUERY_BUDGET_STRICT is set
+"""
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+"""
+statement_shape(statement)
+    the statement with literals and lists of bound parameters collapsed, so the queries of an
+    N+1 loop (same SQL, different ids) share one shape
+"""
+
+
+def statement_shape(statement):
+    return ' '.join(_LITERALS.sub('?', _PARAMETER_LISTS.sub('?', statement)).split())
+
+
+"""
+query_budget(statements)
+    declares the most SQL statements a route may issue in one request, cold caches included
+"""
+
+
+def query_budget(statements):
+
+    def decorator(route):
+
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            g.query_budget = statements
+            return route(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+"""
+init_query_audit(app)
+    when QUERY_AUDIT is set, logs statements slower than SLOW_QUERY_SECONDS with their
+    parameters, duration and route, and checks every request against its query budget and
+    for statement shapes repeated N_PLUS_ONE_THRESHOLD times. violations are logged, or raised
+    as QueryBudgetExceeded with QUERY_BUDGET_STRICT (which is what makes the tests fail)
+"""
+
+
+def init_query_audit(app):
+    app.config.setdefault('QUERY_AUDIT', QUERY_AUDIT)
+    app.config.setdefault('QUERY_BUDGET_STRICT', QUERY_BUDGET_STRICT)
+    app.config.setdefault('SLOW_QUERY_SECONDS', SLOW_QUERY_SECONDS)
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+    if not app.config['QUERY_AUDIT']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_check_request)
+
+
+def _route():
+    return '{} {}'.format(request.method, request.url_rule.rule if request.url_rule is not None else request.path)
+
+
+def _start_request():
+    g.query_statements = 0
+    g.query_shapes = collections.Counter()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('audit_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['audit_started'].pop()
+    if not has_app_context():
+        return
+    in_request = has_request_context() and 'query_shapes' in g
+    if in_request:
+        g.query_statements += 1
+        # the batches of one executemany share a shape without being an N+1
+        if not executemany:
+            g.query_shapes[statement_shape(statement)] += 1
+    if duration >= current_app.config['SLOW_QUERY_SECONDS']:
+        logger.warning('slow query %.1f ms on %s: %s parameters=%s', duration * 1000,
+                       _route() if in_request else 'no request', ' '.join(statement.split()),
+                       repr(parameters)[:SLOW_QUERY_PARAMETERS_LENGTH])
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('audit_started'):
+        context.connection.info['audit_started'].pop()
+
+
+def _check_request(response):
+    shapes = g.get('query_shapes')
+    if shapes is None:
+        return response
+    problems = []
+    budget = g.get('query_budget')
+    statements = g.query_statements
+    if budget is not None and statements > budget:
+        problems.append('{} statements over a budget of {}'.format(statements, budget))
+    for shape, count in shapes.items():
+        if count >= current_app.config['N_PLUS_ONE_THRESHOLD']:
+            problems.append('possible N+1, {} x {}'.format(count, shape))
+    for problem in problems:
+        logger.warning('%s: %s', _route(), problem)
+    if problems and current_app.config['QUERY_BUDGET_STRICT']:
+        raise QueryBudgetExceeded('{}: {}'.format(_route(), '; '.join(problems)))
+    return response
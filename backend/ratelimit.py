@@ -0,0 +1,224 @@
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+RATE_LIMIT_RATE = 10.0
+RATE_LIMIT_BURST = 40
+RATE_LIMIT_MAX_CLIENTS = 100000
+CONCURRENCY_LIMIT = 0
+CONCURRENCY_RETRY_AFTER_SECONDS = 1
+API_KEY_HEADER = 'X-API-Key'
+# WSGI environ key of a request that was admitted before it reached the app (by backend.asgi)
+ADMITTED_ENVIRON_KEY = 'trivia.admitted'
+SQLITE_PRUNE_EVERY = 1000
+
+
+def _refill(state, now, cost, rate, burst):
+    # (tokens, seconds to wait) after taking cost from a bucket last seen as state = (tokens, updated_at)
+    tokens, updated_at = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+"""
+MemoryBucketStore(max_clients)
+    token buckets of one process, the least recently used client is dropped once max_clients
+    buckets are kept (a dropped bucket comes back full).
+    any object with the same take(key, cost, rate, burst) method can be used as a store
+"""
+
+
+class MemoryBucketStore:
+
+    def __init__(self, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.max_clients = max_clients
+
+    def take(self, key, cost, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, wait = _refill(self._buckets.pop(key, None), now, cost, rate, burst)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+"""
+SqliteBucketStore(path)
+    token buckets in an SQLite file, shared by the worker processes of one host. buckets that
+    have refilled completely are pruned every SQLITE_PRUNE_EVERY takes
+"""
+
+
+class SqliteBucketStore:
+
+    def __init__(self, path):
+        self._local = threading.local()
+        self.path = path
+        self._connection().execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                                   'updated_at REAL NOT NULL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.takes = 0
+        return connection
+
+    def take(self, key, cost, rate, burst):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            state = connection.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, wait = _refill(state, now, cost, rate, burst)
+            connection.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', (key, tokens, now))
+            self._local.takes += 1
+            if self._local.takes % SQLITE_PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM buckets WHERE updated_at < ?', (now - burst / rate,))
+        return wait
+
+
+"""
+Admission
+    admission control for the expensive routes. the token bucket rate limiter charges each
+    client the route's cost and answers 429 when the bucket is short; the concurrency limiter
+    answers 503 to new requests while CONCURRENCY_LIMIT admitted requests are in flight in
+    this process. both send Retry-After. configured from RATE_LIMIT ('none', 'memory', 'sqlite'
+    or a store object), RATE_LIMIT_RATE tokens per second, RATE_LIMIT_BURST, API_KEYS (a list
+    or comma separated string of the keys clients may identify with) and CONCURRENCY_LIMIT
+    (0 turns it off)
+"""
+
+
+class Admission:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.store = None
+        self.rate = RATE_LIMIT_RATE
+        self.burst = RATE_LIMIT_BURST
+        self.limit = CONCURRENCY_LIMIT
+        self.retry_after = CONCURRENCY_RETRY_AFTER_SECONDS
+        self.in_flight = 0
+        self.api_keys = frozenset()
+
+    def configure(self, app):
+        app.config.setdefault('RATE_LIMIT', 'none')
+        app.config.setdefault('RATE_LIMIT_RATE', RATE_LIMIT_RATE)
+        app.config.setdefault('RATE_LIMIT_BURST', RATE_LIMIT_BURST)
+        app.config.setdefault('RATE_LIMIT_MAX_CLIENTS', RATE_LIMIT_MAX_CLIENTS)
+        app.config.setdefault('RATE_LIMIT_PATH', os.path.join(app.instance_path, 'rate_limit.sqlite'))
+        app.config.setdefault('API_KEYS', os.getenv('API_KEYS', ''))
+        app.config.setdefault('CONCURRENCY_LIMIT', CONCURRENCY_LIMIT)
+        app.config.setdefault('CONCURRENCY_RETRY_AFTER_SECONDS', CONCURRENCY_RETRY_AFTER_SECONDS)
+        backend = app.config['RATE_LIMIT']
+        if backend == 'sqlite':
+            os.makedirs(os.path.dirname(app.config['RATE_LIMIT_PATH']), exist_ok=True)
+            self.store = SqliteBucketStore(app.config['RATE_LIMIT_PATH'])
+        elif backend == 'memory':
+            self.store = MemoryBucketStore(app.config['RATE_LIMIT_MAX_CLIENTS'])
+        elif backend in (None, 'none'):
+            self.store = None
+        else:
+            self.store = backend
+        self.rate = float(app.config['RATE_LIMIT_RATE'])
+        self.burst = float(app.config['RATE_LIMIT_BURST'])
+        api_keys = app.config['API_KEYS']
+        if isinstance(api_keys, str):
+            api_keys = api_keys.split(',')
+        self.api_keys = frozenset(key.strip() for key in api_keys if key and key.strip())
+        self.limit = app.config['CONCURRENCY_LIMIT']
+        self.retry_after = app.config['CONCURRENCY_RETRY_AFTER_SECONDS']
+        self.in_flight = 0
+
+    """
+    client_key(api_key, remote_addr)
+        the bucket a request is charged to: its API key when that is one of API_KEYS, else its
+        address. an unknown key is ignored, a client could otherwise get a fresh bucket by
+        sending a new one with every request
+    """
+
+    def client_key(self, api_key, remote_addr):
+        if api_key and api_key in self.api_keys:
+            return 'key:' + api_key
+        return 'addr:' + (remote_addr or '')
+
+    def enter(self):
+        if not self.limit:
+            return
+        with self._lock:
+            if self.in_flight >= self.limit:
+                raise ServiceUnavailable(retry_after=self.retry_after)
+            self.in_flight += 1
+
+    def leave(self):
+        if not self.limit:
+            return
+        with self._lock:
+            self.in_flight -= 1
+
+    def take(self, key, cost):
+        if self.store is None:
+            return
+        # a cost above the burst could never be paid
+        wait = self.store.take(key, min(cost, self.burst), self.rate, self.burst)
+        if wait > 0:
+            raise TooManyRequests(retry_after=math.ceil(wait))
+
+
+admission = Admission()
+
+"""
+retry_after_headers(error)
+    the Retry-After header of a 429 or 503 error, for the JSON error handlers
+"""
+
+
+def retry_after_headers(error):
+    retry_after = getattr(error, 'retry_after', None)
+    return {'Retry-After': str(retry_after)} if retry_after is not None else {}
+
+
+"""
+rate_limited(cost)
+    admits a request to the route through admission control first: 503 while the process is
+    at its concurrency limit, 429 when the client cannot pay cost tokens. the concurrency slot
+    is held until the route returns (a streamed body finishes after that). the cost is kept
+    as the view's rate_cost
+"""
+
+
+def rate_limited(cost=1):
+
+    def decorator(route):
+
+        @functools.wraps(route)
+        def wrapper(*args, **kwargs):
+            if request.environ.get(ADMITTED_ENVIRON_KEY):
+                return route(*args, **kwargs)
+            admission.enter()
+            try:
+                admission.take(admission.client_key(request.headers.get(API_KEY_HEADER), request.remote_addr), cost)
+                return route(*args, **kwargs)
+            finally:
+                admission.leave()
+
+        wrapper.rate_cost = cost
+        return wrapper
+
+    return decorator
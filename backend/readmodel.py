@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+
+from sqlalchemy import select
+
+from backend.tables import db, Question
+
+"""
+QuestionRecord
+    read-only question row. the orjson provider serializes it straight to a JSON object;
+    format() gives the same dict as Question.format()
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionRecord:
+    id: int
+    question: str
+    answer: str
+    category: int
+    difficulty: int
+
+    def format(self):
+        return {
+            'id': self.id,
+            'question': self.question,
+            'answer': self.answer,
+            'category': self.category,
+            'difficulty': self.difficulty
+        }
+
+
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer, Question.category, Question.difficulty)
+
+"""
+select_questions()
+    SELECT of the question columns, to be narrowed down and passed to question_records()
+"""
+
+
+def select_questions():
+    return select(*QUESTION_COLUMNS)
+
+
+"""
+question_records(query)
+    runs a select_questions() query and maps the rows to QuestionRecords, skipping the ORM
+    identity map and attribute instrumentation
+"""
+
+
+def question_records(query):
+    return [QuestionRecord(*row) for row in db.session.execute(query)]
+
+
+def question_page(limit, after=None, offset=0):
+    query = select_questions().order_by(Question.id)
+    if after is not None:
+        # keyset mode: seek on the primary key instead of walking `offset` rows
+        query = query.where(Question.id > after)
+    else:
+        query = query.offset(offset)
+    return question_records(query.limit(limit))
+
+
+def questions_by_ids(ids):
+    return question_records(select_questions().where(Question.id.in_(ids)))
+
+
+def category_questions(category, limit, after=None, offset=0):
+    # walks ix_questions_category_id in order
+    query = select_questions().where(Question.category == category).order_by(Question.id)
+    if after is not None:
+        query = query.where(Question.id > after)
+    else:
+        query = query.offset(offset)
+    return question_records(query.limit(limit))
+
+
+def question_record(question_id):
+    records = question_records(select_questions().where(Question.id == question_id))
+    return records[0] if records else None
@@ -0,0 +1,292 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context
+
+from backend.routing import reads_own_writes
+from backend.tables import category_listeners, question_listeners
+
+RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+RESPONSE_CACHE_TTL_SECONDS = 60
+
+"""
+render_total_questions(body, total_questions)
+    adds totalQuestions with the current count to a cached body, which is serialized without
+    it. the count goes in right after the opening brace, so nothing in the body (a question
+    text included) is ever searched or replaced
+"""
+
+
+def render_total_questions(body, total_questions):
+    return b'{"totalQuestions":' + str(total_questions).encode('ascii') + b',' + body[1:]
+
+
+"""
+MemoryResponseCache(max_bytes, ttl)
+    in-process LRU of serialized response bodies, bounded by the total size of the bodies.
+    every entry has tags and an optional `upper` id (the last question id on the page) so
+    invalidate(tag, min_upper) can evict only the pages a write can have changed
+"""
+
+
+class MemoryResponseCache:
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._bytes = 0
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def _drop(self, key):
+        body, tags, upper, expires_at = self._entries.pop(key)
+        self._bytes -= len(body)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, body, tags, upper=None):
+        if len(body) > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (body, tuple(tags), upper, time.monotonic() + self.ttl)
+            self._bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                evicted += 1
+        return evicted
+
+    def invalidate(self, tag, min_upper=None):
+        with self._lock:
+            keys = [key for key in self._tags.get(tag, ())
+                    if min_upper is None or self._entries[key][2] is None or self._entries[key][2] >= min_upper]
+            for key in keys:
+                self._drop(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def size(self):
+        return len(self._entries), self._bytes
+
+
+"""
+SqliteResponseCache(path, max_bytes, ttl)
+    the same cache kept in a local SQLite file, so every worker process on the host shares
+    the cached bodies and sees the evictions caused by the other workers' writes
+"""
+
+
+class SqliteResponseCache:
+
+    def __init__(self, path, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self._local = threading.local()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB NOT NULL, '
+                               'size INTEGER NOT NULL, upper INTEGER, expires_at REAL NOT NULL, '
+                               'used_at REAL NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS entry_tags (tag TEXT NOT NULL, key TEXT NOT NULL, '
+                               'PRIMARY KEY (tag, key))')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_entries_used_at ON entries (used_at)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _drop(connection, keys):
+        for key in keys:
+            connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            connection.execute('DELETE FROM entry_tags WHERE key = ?', (key,))
+
+    def get(self, key):
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute('SELECT body, expires_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            with connection:
+                self._drop(connection, [key])
+            return None
+        connection.execute('UPDATE entries SET used_at = ? WHERE key = ?', (now, key))
+        return bytes(row[0])
+
+    def set(self, key, body, tags, upper=None):
+        if len(body) > self.max_bytes:
+            return 0
+        connection = self._connection()
+        now = time.time()
+        evicted = 0
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            self._drop(connection, [key])
+            connection.execute('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, body, len(body), upper, now + self.ttl, now))
+            connection.executemany('INSERT OR IGNORE INTO entry_tags VALUES (?, ?)', [(tag, key) for tag in tags])
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            while total > self.max_bytes:
+                oldest = connection.execute('SELECT key, size FROM entries ORDER BY used_at LIMIT 1').fetchone()
+                self._drop(connection, [oldest[0]])
+                total -= oldest[1]
+                evicted += 1
+        return evicted
+
+    def invalidate(self, tag, min_upper=None):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            keys = [row[0] for row in connection.execute(
+                'SELECT e.key FROM entry_tags t JOIN entries e ON e.key = t.key '
+                'WHERE t.tag = ? AND (? IS NULL OR e.upper IS NULL OR e.upper >= ?)', (tag, min_upper, min_upper))]
+            self._drop(connection, keys)
+        return len(keys)
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM entries')
+            connection.execute('DELETE FROM entry_tags')
+
+    def size(self):
+        return self._connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+
+
+"""
+ResponseCache
+    front for the configured cache store that counts hits, misses, stores, evictions and
+    invalidations, and evicts the pages a question or category write can have changed.
+    a body rendered while an invalidation ran (generation moved on) is not stored,
+    since it can predate the write. a request that reads its own writes (see
+    backend.routing) is neither served from nor stored in the cache: it is answered from
+    the primary, and cached bodies may have been rendered from the replica
+"""
+
+
+class ResponseCache:
+
+    def __init__(self, store=None):
+        self._lock = threading.Lock()
+        self.reset(store)
+
+    def reset(self, store=None):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def configure(self, app):
+        app.config.setdefault('RESPONSE_CACHE', 'memory')
+        app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', RESPONSE_CACHE_MAX_BYTES)
+        app.config.setdefault('RESPONSE_CACHE_TTL_SECONDS', RESPONSE_CACHE_TTL_SECONDS)
+        app.config.setdefault('RESPONSE_CACHE_PATH', os.path.join(app.instance_path, 'response_cache.sqlite'))
+        backend = app.config['RESPONSE_CACHE']
+        max_bytes = app.config['RESPONSE_CACHE_MAX_BYTES']
+        ttl = app.config['RESPONSE_CACHE_TTL_SECONDS']
+        if backend == 'sqlite':
+            os.makedirs(os.path.dirname(app.config['RESPONSE_CACHE_PATH']), exist_ok=True)
+            self.reset(SqliteResponseCache(app.config['RESPONSE_CACHE_PATH'], max_bytes, ttl))
+        elif backend == 'memory':
+            self.reset(MemoryResponseCache(max_bytes, ttl))
+        else:
+            self.reset()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _bypassed(self):
+        return self.store is None or (has_request_context() and reads_own_writes())
+
+    def get(self, key):
+        if self._bypassed():
+            return None
+        body = self.store.get(key)
+        self._count('hits' if body is not None else 'misses')
+        return body
+
+    def set(self, key, body, tags, upper=None, generation=None):
+        if self._bypassed() or (generation is not None and generation != self.generation):
+            return
+        self._count('stores')
+        self._count('evictions', self.store.set(key, body, tags, upper))
+
+    def invalidate(self, tag, min_upper=None):
+        if self.store is not None:
+            self._count('generation')
+            self._count('invalidations', self.store.invalidate(tag, min_upper))
+
+    def question_changed(self, action, questions):
+        if not questions:
+            return
+        if action == 'update':
+            # the question may have moved between categories, so every category listing goes
+            self.invalidate('questions')
+            self.invalidate('category')
+            return
+        if action == 'insert':
+            # new ids sort last, so only the short last page of a listing changes
+            self.invalidate('questions:last')
+        else:
+            self.invalidate('questions', min_upper=min(question['id'] for question in questions))
+        for category in {question['category'] for question in questions}:
+            self.invalidate('category:{}'.format(category))
+
+    def category_changed(self):
+        self.invalidate('categories')
+
+    def format(self):
+        entries, size = self.store.size() if self.store is not None else (0, 0)
+        return {
+            'backend': type(self.store).__name__ if self.store is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': entries,
+            'bytes': size
+        }
+
+
+response_cache = ResponseCache()
+question_listeners.append(response_cache.question_changed)
+category_listeners.append(response_cache.category_changed)
@@ -0,0 +1,68 @@
+import functools
+import time
+
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+REPLICA_STICKY_SECONDS = 5
+LAST_WRITE_COOKIE = 'trivia_last_write'
+READ_YOUR_WRITES_HEADER = 'X-Read-Your-Writes'
+
+"""
+RoutingSession
+    Flask-SQLAlchemy session that sends the reads of a read_only request to the 'replica' bind.
+    flushes and INSERT/UPDATE/DELETE statements always go to the primary
+"""
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_replica', False):
+            if clause is None or not getattr(clause, 'is_dml', False):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+"""
+read_only
+    marks a route as safe to serve from the replica.
+    a client that wrote less than REPLICA_STICKY_SECONDS ago (per the last write cookie),
+    or that sends X-Read-Your-Writes, stays on the primary so it sees its own writes
+"""
+
+
+def read_only(route):
+
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        g.use_replica = not reads_own_writes()
+        return route(*args, **kwargs)
+
+    return wrapper
+
+
+def reads_own_writes():
+    if request.headers.get(READ_YOUR_WRITES_HEADER):
+        return True
+    last_write = request.cookies.get(LAST_WRITE_COOKIE, None, type=float)
+    sticky_seconds = current_app.config.get('REPLICA_STICKY_SECONDS', REPLICA_STICKY_SECONDS)
+    return last_write is not None and time.time() - last_write < sticky_seconds
+
+
+"""
+remember_write(response)
+    after a successful write, stamps the client with the last write cookie
+"""
+
+
+def remember_write(response):
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and not g.get('read_only', False) \
+            and response.status_code < 400:
+        sticky_seconds = current_app.config.get('REPLICA_STICKY_SECONDS', REPLICA_STICKY_SECONDS)
+        response.set_cookie(LAST_WRITE_COOKIE, str(time.time()), max_age=sticky_seconds, httponly=True)
+    return response
@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+
+from backend.tables import db, Question, question_listeners
+
+SAMPLE_ATTEMPTS = 8
+
+"""
+CategoryIds
+    ids of the questions in one category, kept in a list for O(1) random picks
+    and a position map for O(1) removal
+"""
+
+
+class CategoryIds:
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.positions = {question_id: index for index, question_id in enumerate(self.ids)}
+        self.loaded_at = time.monotonic()
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def remove(self, question_id):
+        index = self.positions.pop(question_id, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if last != question_id:
+            self.ids[index] = last
+            self.positions[last] = index
+
+
+"""
+QuestionSampler(refresh_interval)
+    picks a random question id from a category without loading the candidate rows.
+    per-category id arrays are loaded on first use, kept current through question_changed()
+    and reloaded once they are older than refresh_interval seconds
+"""
+
+
+class QuestionSampler:
+
+    def __init__(self, refresh_interval=60):
+        self._lock = threading.Lock()
+        self._categories = {}
+        self.refresh_interval = refresh_interval
+
+    def cached(self, category_id):
+        # the category's ids if they are loaded and fresh, None when using them would query the database
+        category_ids = self._categories.get(category_id)
+        if category_ids is None or time.monotonic() - category_ids.loaded_at >= self.refresh_interval:
+            return None
+        return category_ids
+
+    def _ids(self, category_id):
+        category_ids = self.cached(category_id)
+        if category_ids is None:
+            rows = db.session.query(Question.id).filter(Question.category == category_id).all()
+            category_ids = CategoryIds(row.id for row in rows)
+            with self._lock:
+                self._categories[category_id] = category_ids
+        return category_ids
+
+    def pick(self, category_id, exclude=(), category_ids=None):
+        if category_ids is None:
+            category_ids = self._ids(category_id)
+        with self._lock:
+            ids = category_ids.ids
+            if not ids:
+                return None
+            # rejection sampling is O(1) while most of the category is still unplayed
+            for _ in range(SAMPLE_ATTEMPTS):
+                question_id = random.choice(ids)
+                if question_id not in exclude:
+                    return question_id
+            remaining = [question_id for question_id in ids if question_id not in exclude]
+        if not remaining:
+            return None
+        return random.choice(remaining)
+
+    def category_ids(self, category_id):
+        category_ids = self._ids(category_id)
+        with self._lock:
+            return list(category_ids.ids)
+
+    def discard(self, category_id, question_id):
+        with self._lock:
+            category_ids = self._categories.get(category_id)
+            if category_ids is not None:
+                category_ids.remove(question_id)
+
+    def question_changed(self, action, questions):
+        with self._lock:
+            if action == 'update':
+                # the previous category is unknown, reload on the next pick
+                self._categories.clear()
+                return
+            for question in questions:
+                category_ids = self._categories.get(question['category'])
+                if category_ids is None:
+                    continue
+                if action == 'insert':
+                    category_ids.add(question['id'])
+                else:
+                    category_ids.remove(question['id'])
+
+
+question_sampler = QuestionSampler()
+question_listeners.append(question_sampler.question_changed)
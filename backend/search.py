@@ -0,0 +1,167 @@
+import threading
+
+from sqlalchemy import func, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.readmodel import select_questions, question_records, questions_by_ids
+from backend.tables import db, Question, question_listeners
+
+SEARCH_RESULT_LIMIT = 100
+
+"""
+PostgresSearchBackend
+    case-insensitive substring search that can use a pg_trgm GIN index on questions.question.
+    prepare() creates the extension and index when the database user is allowed to;
+    without them it still answers with a plain ILIKE scan
+"""
+
+
+class PostgresSearchBackend:
+
+    def __init__(self):
+        # unknown until prepare() runs or the first search checks pg_extension
+        self.trigram = None
+
+    def prepare(self):
+        try:
+            db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_questions_question_trgm '
+                                    'ON questions USING gin (question gin_trgm_ops)'))
+            db.session.commit()
+            self.trigram = True
+        except SQLAlchemyError:
+            db.session.rollback()
+            self.trigram = False
+
+    def search(self, search_term, limit):
+        if self.trigram is None:
+            self.trigram = db.session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+        query = select_questions().where(Question.question.icontains(search_term, autoescape=True))
+        if self.trigram:
+            query = query.order_by(func.similarity(Question.question, search_term).desc(), Question.id)
+        else:
+            query = query.order_by(Question.id)
+        return question_records(query.limit(limit))
+
+    def question_changed(self, action, questions):
+        pass
+
+
+"""
+InvertedIndexSearchBackend
+    in-process trigram index over questions.question for SQLite and development.
+    the index is built on first search and kept current through question_changed();
+    candidates from the index are confirmed with a substring check, so results match ILIKE
+"""
+
+
+class InvertedIndexSearchBackend:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = None
+        self._postings = {}
+
+    def prepare(self):
+        with self._lock:
+            self._texts = None
+            self._postings = {}
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _add(self, question_id, question):
+        question = (question or '').lower()
+        self._texts[question_id] = question
+        for trigram in self._trigrams(question):
+            self._postings.setdefault(trigram, set()).add(question_id)
+
+    def _remove(self, question_id):
+        question = self._texts.pop(question_id, None)
+        if question is None:
+            return
+        for trigram in self._trigrams(question):
+            posting = self._postings.get(trigram)
+            if posting is not None:
+                posting.discard(question_id)
+                if not posting:
+                    del self._postings[trigram]
+
+    def _build(self):
+        with self._lock:
+            if self._texts is None:
+                self._texts = {}
+                for question_id, question in db.session.query(Question.id, Question.question):
+                    self._add(question_id, question)
+
+    def _match(self, term):
+        with self._lock:
+            trigrams = self._trigrams(term)
+            if not trigrams:
+                candidates = self._texts.keys()
+            else:
+                postings = sorted((self._postings.get(trigram, ()) for trigram in trigrams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            # shorter questions containing the term rank higher, ties go to the older question
+            return sorted((len(self._texts[question_id]), question_id)
+                          for question_id in candidates if term in self._texts[question_id])
+
+    def search(self, search_term, limit):
+        if self._texts is None:
+            self._build()
+        ranked_ids = [question_id for _, question_id in self._match(search_term.lower())[:limit]]
+        if not ranked_ids:
+            return []
+        questions = {question.id: question for question in questions_by_ids(ranked_ids)}
+        return [questions[question_id] for question_id in ranked_ids if question_id in questions]
+
+    def question_changed(self, action, questions):
+        with self._lock:
+            if self._texts is None:
+                return
+            for question in questions:
+                self._remove(question['id'])
+                if action != 'delete':
+                    self._add(question['id'], question['question'])
+
+
+"""
+QuestionSearch
+    picks the search backend for the app's database: SEARCH_BACKEND may be
+    'postgres', 'memory' or 'auto' (postgres on PostgreSQL, memory elsewhere).
+    configure() does not touch the database; prepare() creates the search indexes
+"""
+
+
+class QuestionSearch:
+
+    def __init__(self):
+        self.backend = InvertedIndexSearchBackend()
+
+    def configure(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.config.setdefault('SEARCH_RESULT_LIMIT', SEARCH_RESULT_LIMIT)
+        backend = app.config['SEARCH_BACKEND']
+        if backend == 'auto':
+            dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+            backend = 'postgres' if dialect == 'postgresql' else 'memory'
+        if backend == 'postgres':
+            self.backend = PostgresSearchBackend()
+        else:
+            self.backend = InvertedIndexSearchBackend()
+
+    def prepare(self):
+        self.backend.prepare()
+
+    def search(self, search_term, limit):
+        return self.backend.search(search_term, limit)
+
+    def question_changed(self, action, questions):
+        self.backend.question_changed(action, questions)
+
+
+question_search = QuestionSearch()
+question_listeners.append(question_search.question_changed)
@@ -0,0 +1,96 @@
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+QUIZ_SESSION_MAX = 10000
+QUIZ_SESSION_TTL_SECONDS = 1800
+
+"""
+MemorySessionStore(max_sessions, ttl)
+    bounded in-process store for quiz session state.
+    entries expire ttl seconds after they were last written and the least recently
+    used entry is evicted once max_sessions is reached.
+    any object with the same get/set/delete methods can be used as a store
+"""
+
+
+class MemorySessionStore:
+
+    def __init__(self, max_sessions=QUIZ_SESSION_MAX, ttl=QUIZ_SESSION_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+    def _evict_expired(self, now):
+        while self._entries:
+            token, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[token]
+
+    def get(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[token]
+                return None
+            return value
+
+    def set(self, token, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(token, None)
+            self._entries[token] = (now + self.ttl, value)
+            self._evict_expired(now)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def delete(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+"""
+QuizSessions(store)
+    quiz sessions holding a pre-shuffled deck of question ids per player,
+    so each /quizzes call pops one id instead of excluding the previous questions
+"""
+
+
+class QuizSessions:
+
+    def __init__(self, store=None):
+        self._lock = threading.Lock()
+        self.store = store if store is not None else MemorySessionStore()
+
+    def start(self, category_id, question_ids):
+        deck = list(question_ids)
+        random.shuffle(deck)
+        token = secrets.token_urlsafe(16)
+        self.store.set(token, {'category': category_id, 'deck': deck})
+        return token, len(deck)
+
+    def next(self, token):
+        with self._lock:
+            session = self.store.get(token)
+            if session is None:
+                raise KeyError(token)
+            question_id = session['deck'].pop() if session['deck'] else None
+            self.store.set(token, session)
+        return session['category'], question_id
+
+    def end(self, token):
+        self.store.delete(token)
+
+
+quiz_sessions = QuizSessions()
@@ -1,26 +1,106 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, ForeignKey, String, Integer, Index, create_engine, event, func, delete, inspect
 from flask_sqlalchemy import SQLAlchemy
 import json
 
-database_name = "trivia"
-database_path = "postgresql://{}:{}@{}/{}".format('student', 'george', 'localhost:5432', database_name)
+from backend.cache import CategoryCache
+from backend.counters import QuestionCounter
+from backend.migrations import pending, stamp, upgrade
+from backend.pool import PoolStats, pool_options
+from backend.routing import RoutingSession, REPLICA_BIND
 
-db = SQLAlchemy()
+database_name = os.getenv("DB_NAME", "trivia")
+database_path = os.getenv("DATABASE_URL") or "postgresql://{}:{}@{}/{}".format(
+    os.getenv("DB_USERNAME", "student"), os.getenv("DB_PASSWORD", "george"), os.getenv("DB_HOST", "localhost:5432"),
+    database_name)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# callables notified with (action, [formatted question, ...]) after questions are committed
+question_listeners = []
+# callables notified without arguments after a category is inserted or deleted
+category_listeners = []
 
 """
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service.
+    the connection pool is sized from the DB_POOL_* settings and its checkouts are
+    recorded in app.extensions['pool_stats'].
+    replica_path (or SQLALCHEMY_REPLICA_URI / DATABASE_REPLICA_URL) adds a read replica bind
+    that read_only routes are served from, with its own pool stats in app.extensions['replica_pool_stats'].
+    tables are only created (or upgraded) when DB_CREATE_ALL is set (the default, turn it off
+    with DB_CREATE_ALL=0 in production and run `flask init-db` / `flask upgrade-db` instead).
+    SQLite connections get PRAGMA foreign_keys=ON so questions.category is enforced there too
 """
 
 
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, replica_path=None):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+    app.config["SQLALCHEMY_REPLICA_URI"] = replica_path or app.config.get("SQLALCHEMY_REPLICA_URI") or \
+        os.getenv("DATABASE_REPLICA_URL")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    db.app = app
+    app.config.setdefault("DB_CREATE_ALL", os.getenv("DB_CREATE_ALL", "1").lower() not in ("0", "false", "no"))
+    app.config.setdefault("QUESTION_COUNT_RECONCILE_SECONDS",
+                          int(os.getenv("QUESTION_COUNT_RECONCILE_SECONDS", 60)))
+    question_counter.reconcile_interval = app.config["QUESTION_COUNT_RECONCILE_SECONDS"]
+    app.extensions["pool_stats"] = PoolStats()
+    engine_options = pool_options(app, database_path, app.extensions["pool_stats"])
+    engine_options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+    if app.config["SQLALCHEMY_REPLICA_URI"]:
+        app.extensions["replica_pool_stats"] = PoolStats()
+        replica_options = pool_options(app, app.config["SQLALCHEMY_REPLICA_URI"],
+                                       app.extensions["replica_pool_stats"])
+        replica_options["url"] = app.config["SQLALCHEMY_REPLICA_URI"]
+        app.config.setdefault("SQLALCHEMY_BINDS", {})[REPLICA_BIND] = replica_options
     db.init_app(app)
     with app.app_context():
-        db.create_all()
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _enable_foreign_keys)
+    if app.config["DB_CREATE_ALL"]:
+        init_db(app, upgrade_existing=False)
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+"""
+init_db(app, upgrade_existing=True)
+    creates the tables that do not exist yet on the primary database. a fresh schema is
+    stamped with the latest migration, an existing one is brought up to it with upgrade_db().
+    the schema work at startup passes upgrade_existing=False: a migration can change what a
+    delete removes, so there pending migrations are only logged, for `flask upgrade-db`
+"""
+
+
+def init_db(app, upgrade_existing=True):
+    with app.app_context():
+        fresh = not inspect(db.engine).has_table(Question.__tablename__)
+        db.create_all(bind_key=None)
+        if fresh:
+            stamp(db.engine)
+        elif upgrade_existing:
+            upgrade(db.engine, db.metadata)
+        else:
+            for version, description in pending(db.engine):
+                app.logger.warning('schema migration %s (%s) is pending, run `flask upgrade-db` to apply it',
+                                   version, description)
+
+
+"""
+upgrade_db(app)
+    applies the pending schema migrations of backend/migrations.py to the primary database
+    and returns the versions applied
+"""
+
+
+def upgrade_db(app):
+    with app.app_context():
+        return upgrade(db.engine, db.metadata)
 
 
 """
@@ -31,12 +111,17 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    # (category, id) serves the category listings, which filter on category and page in id order,
+    # (category, difficulty) the per-category difficulty filters
+    __table_args__ = (Index('ix_questions_category_id', 'category', 'id'),
+                      Index('ix_questions_category_difficulty', 'category', 'difficulty'))
 
     id = Column(Integer, primary_key=True)
-    question = Column(String)
-    answer = Column(String)
-    category = Column(Integer)
-    difficulty = Column(Integer)
+    question = Column(String, nullable=False)
+    answer = Column(String, nullable=False)
+    category = Column(Integer, ForeignKey('categories.id', name='fk_questions_category_categories',
+                                          ondelete='CASCADE'), nullable=False)
+    difficulty = Column(Integer, nullable=False)
 
     def __init__(self, question, answer, category, difficulty):
         self.question = question
@@ -46,14 +131,32 @@ class Question(db.Model):
 
     def insert(self):
         db.session.add(self)
+        db.session.flush()
+        question = self.format()
         db.session.commit()
+        questions_changed('insert', [question])
 
     def update(self):
+        question = self.format()
         db.session.commit()
+        questions_changed('update', [question])
 
     def delete(self):
+        question = self.format()
         db.session.delete(self)
         db.session.commit()
+        questions_changed('delete', [question])
+
+    @classmethod
+    def delete_many(cls, ids):
+        # one DELETE ... RETURNING statement, the returned rows say which ids existed
+        rows = db.session.execute(delete(cls).where(cls.id.in_(ids))
+                                  .returning(*QUESTION_RETURNING)
+                                  .execution_options(synchronize_session=False)).all()
+        db.session.commit()
+        questions = [row._asdict() for row in rows]
+        questions_changed('delete', questions)
+        return questions
 
     def format(self):
         return {
@@ -65,6 +168,8 @@ class Question(db.Model):
         }
 
 
+QUESTION_RETURNING = (Question.id, Question.question, Question.answer, Question.category, Question.difficulty)
+
 """
 Category
 
@@ -75,7 +180,7 @@ class Category(db.Model):
     __tablename__ = 'categories'
 
     id = Column(Integer, primary_key=True)
-    type = Column(String)
+    type = Column(String, nullable=False)
 
     def __init__(self, id, type):
         self.id = id
@@ -90,7 +195,53 @@ class Category(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        categories_changed()
 
     def delete(self):
+        # the foreign key cascades too, deleting the questions here tells the question listeners
+        rows = db.session.execute(delete(Question).where(Question.category == self.id)
+                                  .returning(*QUESTION_RETURNING)
+                                  .execution_options(synchronize_session=False)).all()
         db.session.delete(self)
         db.session.commit()
+        if rows:
+            questions_changed('delete', [row._asdict() for row in rows])
+        categories_changed()
+
+
+def _load_categories():
+    return db.session.query(Category.id, Category.type).order_by(Category.id).all()
+
+
+category_cache = CategoryCache(_load_categories)
+category_listeners.append(category_cache.invalidate)
+
+
+"""
+categories_changed()
+    tells every category listener that a category was inserted or deleted
+"""
+
+
+def categories_changed():
+    for listener in category_listeners:
+        listener()
+
+
+"""
+questions_changed(action, questions)
+    tells every question listener that the formatted questions were inserted, updated or deleted
+"""
+
+
+def questions_changed(action, questions):
+    for listener in question_listeners:
+        listener(action, questions)
+
+
+def _load_question_counts():
+    return db.session.query(Question.category, func.count(Question.id)).group_by(Question.category).all()
+
+
+question_counter = QuestionCounter(_load_question_counts)
+question_listeners.append(question_counter.question_changed)
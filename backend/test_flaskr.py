@@ -1,38 +1,74 @@
+import asyncio
+import gzip
 import unittest
 import os
-from flask import json
-from flask_sqlalchemy import SQLAlchemy
-
-from flaskr.__init__ import create_app
-from tables import *
+import tempfile
+import threading
+import time
+from unittest import mock
+from flask import json, jsonify
+from sqlalchemy.exc import IntegrityError
+
+from backend.asgi import TriviaASGI
+from backend.counters import QuestionCounter
+from backend.flaskr import create_app
+from backend.group_commit import group_commit
+from backend.http_cache import data_version
+from backend.migrations import current_version, schema_version
+from backend.ratelimit import admission
+from backend.query_audit import query_budget
+from backend.tables import *
 from dotenv import load_dotenv, dotenv_values
 
 
+async def asgi_request(asgi_app, method, path, body=None, headers=()):
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+             'http_version': '1.1', 'scheme': 'http',
+             'headers': [(b'content-type', b'application/json')] + [(name.lower().encode('latin-1'),
+                                                                     value.encode('latin-1'))
+                                                                    for name, value in headers]}
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in sent[0]['headers']}
+    data = b''.join(message.get('body', b'') for message in sent[1:])
+    if response_headers.get('content-encoding') == 'gzip':
+        data = gzip.decompress(data)
+    return sent[0]['status'], json.loads(data), response_headers
+
+
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
         """Define test variables and initialize app."""
         load_dotenv()
-        self.app = create_app()
-        self.client = self.app.test_client
         self.database_name = "trivia_test"
         self.db_username = os.getenv("DB_USERNAME")
         self.db_password = os.getenv("DB_PASSWORD")
         self.database_path = "postgresql://{}:{}@{}/{}".format(self.db_username, self.db_password, 'localhost:5432',
                                                                self.database_name)
-        setup_db(self.app, self.database_path)
+        # create_app binds the database and creates the tables once.
+        # a route issuing more statements than its query_budget, or an N+1, fails with a 500
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path,
+                               'QUERY_AUDIT': True, 'QUERY_BUDGET_STRICT': True})
+        self.client = self.app.test_client
 
         # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
 
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        self.app_context.pop()
 
     """
     TODO
@@ -56,6 +92,107 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertIn('question', data)
 
+    def test_asgi_quizzes_200(self):
+        try:
+            asgi_app = TriviaASGI(self.app)
+        except (ImportError, ValueError) as e:
+            self.skipTest('no async database driver: {}'.format(e))
+
+        async def requests():
+            try:
+                # the first request loads the category through the Flask route, the second is served async
+                quiz = {'quizCategory': 1, 'previousQuestions': []}
+                quizzes = [await asgi_request(asgi_app, 'POST', '/quizzes', quiz) for _ in range(2)]
+                return quizzes, await asgi_request(asgi_app, 'POST', '/quizzes', {'quizCategory': 1000}), \
+                    await asgi_request(asgi_app, 'GET', '/categories')
+            finally:
+                await asgi_app.close()
+
+        quizzes, not_found, categories = asyncio.run(requests())
+        for status, data, _ in quizzes:
+            self.assertEqual(status, 200)
+            self.assertEqual(data['question']['category'], 1)
+        self.assertEqual(not_found[:2], (404, {'success': False, 'error': 404, 'message': 'Resource Not Found'}))
+        self.assertEqual(categories[0], 200)
+        self.assertTrue(categories[1]['categories'])
+
+    def test_asgi_rate_limit_sqlite_429(self):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'RATE_LIMIT': 'sqlite',
+                          'RATE_LIMIT_PATH': os.path.join(tempfile.mkdtemp(), 'rate_limit.sqlite'),
+                          'RATE_LIMIT_RATE': 0.5, 'RATE_LIMIT_BURST': 3})
+        try:
+            asgi_app = TriviaASGI(app)
+        except (ImportError, ValueError) as e:
+            self.skipTest('no async database driver: {}'.format(e))
+
+        async def requests():
+            try:
+                quiz = {'quizCategory': 1, 'previousQuestions': []}
+                return [await asgi_request(asgi_app, 'POST', '/quizzes', quiz) for _ in range(2)]
+            finally:
+                await asgi_app.close()
+
+        quizzes = asyncio.run(requests())
+        self.assertEqual([status for status, _, _ in quizzes], [200, 429])
+        self.assertEqual(quizzes[1][2]['retry-after'], '2')
+
+    def test_asgi_quizzes_compressed(self):
+        try:
+            asgi_app = TriviaASGI(self.app)
+        except (ImportError, ValueError) as e:
+            self.skipTest('no async database driver: {}'.format(e))
+        category = Category(8, 'Long Questions')
+        category.insert()
+        long_question = 'Which answer ' + 'is it ' * 300 + '?'
+        Question(long_question, 'This one', category.id, 1).insert()
+
+        async def requests():
+            try:
+                quiz = {'quizCategory': category.id, 'previousQuestions': []}
+                return [await asgi_request(asgi_app, 'POST', '/quizzes', quiz, [('Accept-Encoding', 'gzip')])
+                        for _ in range(2)]
+            finally:
+                await asgi_app.close()
+
+        try:
+            quizzes = asyncio.run(requests())
+        finally:
+            category.delete()
+        # the second request is the one served on the async engine
+        status, data, headers = quizzes[1]
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(data['question']['question'], long_question)
+
+    def test_rate_limit_429(self):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'RATE_LIMIT': 'memory',
+                          'RATE_LIMIT_RATE': 0.5, 'RATE_LIMIT_BURST': 5, 'API_KEYS': 'known'})
+        client = app.test_client()
+        res = client.post('/questions/search', json={'searchTerm': 'title'})
+        self.assertEqual(res.status_code, 200)
+        res = client.post('/questions/search', json={'searchTerm': 'title'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.headers['Retry-After'], '10')
+        self.assertEqual(data, {'success': False, 'error': 429, 'message': 'Too Many Requests'})
+        # an unknown API key is charged to the address bucket
+        res = client.post('/questions/search', json={'searchTerm': 'title'}, headers={'X-API-Key': 'unknown'})
+        self.assertEqual(res.status_code, 429)
+        # a configured API key has a bucket of its own
+        res = client.post('/questions/search', json={'searchTerm': 'title'}, headers={'X-API-Key': 'known'})
+        self.assertEqual(res.status_code, 200)
+
+    def test_concurrency_limit_503(self):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'CONCURRENCY_LIMIT': 1})
+        admission.enter()
+        try:
+            res = app.test_client().post('/quizzes', json={'quizCategory': 1, 'previousQuestions': []})
+        finally:
+            admission.leave()
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+        self.assertFalse(json.loads(res.data)['success'])
+
     def test_get_questions_200(self):
         res = self.client().get('/questions?page=2')
         data = json.loads(res.data)
@@ -73,6 +210,92 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIn('categories', data)
         self.assertIn('currentCategory', data)
 
+    def test_get_questions_cursor_200(self):
+        res = self.client().get('/questions?after=0&limit=2')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 2)
+        self.assertEqual(data['nextCursor'], data['questions'][-1]['id'])
+        res = self.client().get('/questions?after=' + str(data['nextCursor']) + '&limit=2')
+        next_data = json.loads(res.data)
+        self.assertGreater(next_data['questions'][0]['id'], data['nextCursor'])
+
+    def test_get_questions_limit_422(self):
+        res = self.client().get('/questions?limit=0')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
+    def test_get_questions_304(self):
+        res = self.client().get('/questions?page=1')
+        etag = res.headers['ETag']
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get('/questions?page=1', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        new_question = Question('Does a write change the ETag?', 'Yes', 1, 1)
+        new_question.insert()
+        res = self.client().get('/questions?page=1', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        new_question.delete()
+
+    def test_get_categories_if_modified_since_304(self):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'HTTP_CACHE_REVALIDATE_SECONDS': 0})
+        client = app.test_client()
+        data_version._changed_at = time.time() - 10
+        last_modified = client.get('/categories').headers['Last-Modified']
+        res = client.get('/categories', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(res.status_code, 304)
+        new_category = Category(9, 'Poetry')
+        new_category.insert()
+        try:
+            res = client.get('/categories', headers={'If-Modified-Since': last_modified})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(json.loads(res.data)['categories']['9'], 'Poetry')
+        finally:
+            new_category.delete()
+
+    def test_response_cache_evicts_written_category(self):
+        self.client().get('/categories/1/questions')
+        self.client().get('/categories/2/questions')
+        total_questions = json.loads(self.client().get('/categories/2/questions').data)['totalQuestions']
+        self.assertEqual(self.client().get('/stats/cache').get_json()['hits'], 1)
+        new_question = Question('Does a write evict other categories?', 'No', 1, 1)
+        new_question.insert()
+        res = self.client().get('/categories/2/questions')
+        self.assertEqual(json.loads(res.data)['totalQuestions'], total_questions + 1)
+        res = self.client().get('/categories/1/questions')
+        self.assertIn(new_question.id, [question['id'] for question in json.loads(res.data)['questions']])
+        stats = self.client().get('/stats/cache').get_json()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 3)
+        new_question.delete()
+
+    def test_response_cache_question_text_kept(self):
+        # the text of the placeholder cached bodies once held in place of totalQuestions
+        new_question = Question('\x00totalQuestions\x00', 'Left alone', 1, 1)
+        new_question.insert()
+        try:
+            for path in ('/questions?after={}&limit=1'.format(new_question.id - 1),
+                         '/categories/1/questions?after={}&limit=1'.format(new_question.id - 1)):
+                for _ in range(2):
+                    data = json.loads(self.client().get(path).data)
+                    self.assertEqual(data['questions'][0]['question'], '\x00totalQuestions\x00')
+                    self.assertIsInstance(data['totalQuestions'], int)
+        finally:
+            new_question.delete()
+
+    def test_get_questions_gzip(self):
+        res = self.client().get('/questions?page=1', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        data = json.loads(gzip.decompress(res.data))
+        self.assertEqual(len(data['questions']), 10)
+        res = self.client().get('/categories', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', res.headers)
+
     def test_get_questions_404(self):
         res = self.client().get('/questions?page=10000')
         data = json.loads(res.data)
@@ -108,6 +331,45 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertEqual(data['message'], 'Resource Not Found')
 
+    def test_delete_question_500_logged(self):
+        new_question = Question('Does a failed delete get logged?', 'Yes', 1, 1)
+        new_question.insert()
+        try:
+            with mock.patch.object(Question, 'delete', side_effect=RuntimeError('delete failed')), \
+                    self.assertLogs(self.app.logger, 'ERROR') as logs:
+                res = self.client().delete('/questions/delete/' + str(new_question.id))
+        finally:
+            new_question.delete()
+        self.assertEqual(res.status_code, 500)
+        self.assertIn('RuntimeError: delete failed', logs.output[0])
+        res = self.client().get('/metrics')
+        self.assertIn(b'exception="RuntimeError"} ', res.data)
+
+    def test_batch_delete_questions_200(self):
+        questions = [Question('Batch delete one', 'One', 1, 1), Question('Batch delete two', 'Two', 1, 1)]
+        for question in questions:
+            question.insert()
+        ids = [Question.query.filter(Question.question == question).first().id
+               for question in ('Batch delete one', 'Batch delete two')]
+        res = self.client().get('/questions?ids={},{},100000'.format(*ids))
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['found'], ids)
+        self.assertEqual(data['missing'], [100000])
+        res = self.client().post('/questions/batch-delete', json={'ids': ids + [100000]})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], ids)
+        self.assertEqual(data['missing'], [100000])
+        self.assertIsNone(Question.query.get(ids[0]))
+
+    def test_batch_delete_questions_422(self):
+        res = self.client().post('/questions/batch-delete', json={'ids': []})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertNotIn('deleted', data)
+        self.assertFalse(data['success'])
+
     def test_search_question_200(self):
         search_term = {'searchTerm': 'title'}
         res = self.client().post('/questions/search', json=search_term)
@@ -117,6 +379,13 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIn('totalQuestions', data)
         self.assertIn('currentCategory', data)
 
+    def test_search_question_case_insensitive_200(self):
+        res = self.client().post('/questions/search', json={'searchTerm': 'TITLE', 'limit': 1})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 1)
+        self.assertIn('title', data['questions'][0]['question'].lower())
+
     def test_search_question_404(self):
         search_term = {'searchTerm': 'lalalolo'}
         res = self.client().post('/questions/search', json=search_term)
@@ -140,6 +409,18 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 422)
         self.assertEqual(data['message'], 'Unable to process request')
 
+    def test_search_question_number_404(self):
+        res = self.client().post('/questions/search', json={'searchTerm': 918273645})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['message'], 'Resource Not Found')
+
+    def test_search_question_limit_422(self):
+        res = self.client().post('/questions/search', json={'searchTerm': 'title', 'limit': 'x'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
     def test_search_question_500(self):
         res = self.client().post('/questions/search')
         data = json.loads(res.data)
@@ -165,6 +446,48 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['newQuestionCategory'], param["category"])
         self.assertEqual(data['newQuestionDifficulty'], param["difficulty"])
 
+    def test_create_question_updates_total_questions(self):
+        res = self.client().get('/questions')
+        total_before = json.loads(res.data)['totalQuestions']
+        param = {"question": "How many legs does a spider have?",
+                 "answer": "Eight",
+                 "category": "1",
+                 "difficulty": "1",
+                 }
+        self.client().post('/questions', json=param)
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+        self.assertEqual(data['totalQuestions'], total_before + 1)
+        new_question = Question.query.filter(Question.question == param['question']).first()
+        self.client().delete('/questions/delete/' + str(new_question.id))
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+        self.assertEqual(data['totalQuestions'], total_before)
+
+    def test_question_counter_reconciles_in_background(self):
+        rows = [[(1, 2)], [(1, 3)]]
+        release = threading.Event()
+        reconciled = threading.Event()
+
+        def loader():
+            if len(rows) == 1:
+                release.wait(5)
+                reconciled.set()
+            return rows.pop(0)
+
+        counter = QuestionCounter(loader)
+        self.assertEqual(counter.total(), 2)
+        counter.expire()
+        # the stale count is served while the reload runs off the request path
+        self.assertEqual(counter.total(), 2)
+        release.set()
+        self.assertTrue(reconciled.wait(5))
+        for _ in range(100):
+            if counter.total() == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(counter.category(1), 3)
+
     def test_create_question_422(self):
         param = {"question": None,
                  "answer": None,
@@ -182,6 +505,53 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 422)
         self.assertEqual(data['message'], 'Unable to process request')
 
+    def test_create_question_unknown_category_422(self):
+        param = {"question": "Orphan question", "answer": "None", "category": 1000, "difficulty": 1}
+        res = self.client().post('/questions', json=param)
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(Question.query.filter(Question.question == 'Orphan question').count(), 0)
+
+    def test_schema_upgraded(self):
+        with self.app.app_context():
+            self.assertEqual(upgrade_db(self.app), [])
+            indexes = [index['name'] for index in inspect(db.engine).get_indexes('questions')]
+            self.assertIn('ix_questions_category_difficulty', indexes)
+
+    def test_schema_upgrade_keeps_questions(self):
+        total_questions = Question.query.count()
+        with db.engine.begin() as connection:
+            connection.execute(schema_version.delete().where(schema_version.c.version >= 2))
+        self.assertEqual(upgrade_db(self.app), [2])
+        self.assertEqual(Question.query.count(), total_questions)
+
+    def test_schema_not_upgraded_at_startup(self):
+        with db.engine.begin() as connection:
+            connection.execute(schema_version.delete().where(schema_version.c.version >= 2))
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path})
+        self.assertIn('schema migration 2', logs.output[0])
+        with app.app_context():
+            with db.engine.connect() as connection:
+                self.assertEqual(current_version(connection), 1)
+            self.assertEqual(upgrade_db(app), [2])
+
+    def test_create_question_group_commit(self):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'GROUP_COMMIT_ENABLED': True,
+                          'GROUP_COMMIT_MAX_DELAY_MS': 200})
+        rows = [{'question': 'Grouped question', 'answer': 'One', 'category': 1, 'difficulty': 1},
+                {'question': 'Grouped question', 'answer': 'Two', 'category': 1000, 'difficulty': 1},
+                {'question': 'Grouped question', 'answer': 'Three', 'category': 1, 'difficulty': 1}]
+        futures = [group_commit.submit(row) for row in rows]
+        # the unknown category fails its own row only
+        self.assertRaises(IntegrityError, futures[1].result, 5)
+        ids = [futures[0].result(5), futures[2].result(5)]
+        res = app.test_client().post('/questions', json=rows[0])
+        ids.append(json.loads(res.data)['newQuestionId'])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sorted(question.id for question in Question.query.filter(
+            Question.question == 'Grouped question')), sorted(ids))
+        Question.delete_many(ids)
+
     def test_create_question_500(self):
         res = self.client().post('/questions')
         data = json.loads(res.data)
@@ -194,6 +564,39 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 500)
         self.assertEqual(data['message'], 'Internal Server Error')
 
+    def test_bulk_create_questions_200(self):
+        param = [{"question": "Bulk question one", "answer": "One", "category": "1", "difficulty": "1"},
+                 {"question": "Bulk question two", "answer": None, "category": "1", "difficulty": "1"},
+                 {"question": "Bulk question three", "answer": "Three", "category": "1", "difficulty": "1"}]
+        res = self.client().post('/questions/bulk?batchSize=2', json=param)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 2)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual(len(data['batches']), 1)
+        self.assertEqual(data['batches'][0]['errors'][0]['line'], 2)
+        Question.query.filter(Question.question.like('Bulk question%')).delete(synchronize_session=False)
+        db.session.commit()
+
+    def test_bulk_create_questions_422(self):
+        res = self.client().post('/questions/bulk', json={"question": "Not a list"})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
+    def test_export_questions_200(self):
+        res = self.client().get('/questions/export?format=csv&category=1')
+        self.assertEqual(res.status_code, 200)
+        lines = res.data.decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'id,question,answer,category,difficulty')
+        self.assertEqual(len(lines) - 1, Question.query.filter(Question.category == 1).count())
+
+    def test_export_questions_422(self):
+        res = self.client().get('/questions/export?format=xml')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
     def test_get_category_questions_200(self):
         res = self.client().get('/categories/1/questions')
         data = json.loads(res.data)
@@ -202,6 +605,30 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIn('totalQuestions', data)
         self.assertIn('currentCategory', data)
 
+    def test_get_category_questions_cursor_200(self):
+        res = self.client().get('/categories/1/questions?limit=1')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 1)
+        self.assertEqual(data['nextCursor'], data['questions'][0]['id'])
+        res = self.client().get('/categories/1/questions?limit=1&after=' + str(data['nextCursor']))
+        self.assertGreater(json.loads(res.data)['questions'][0]['id'], data['nextCursor'])
+        res = self.client().get('/categories/1/questions?stream=1')
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertTrue(all(json.loads(line)['category'] == 1 for line in res.data.splitlines()))
+
+    def test_get_category_questions_default_limit_200(self):
+        new_category = Category(10, 'Paging')
+        new_category.insert()
+        try:
+            for n in range(11):
+                Question('Paging question {}?'.format(n), 'Yes', new_category.id, 1).insert()
+            data = json.loads(self.client().get('/categories/10/questions').data)
+            self.assertEqual(len(data['questions']), 10)
+            self.assertEqual(data['nextCursor'], data['questions'][-1]['id'])
+        finally:
+            new_category.delete()
+
     def test_get_category_questions_404(self):
         res = self.client().get('/categories/1000')
         data = json.loads(res.data)
@@ -213,6 +640,37 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertEqual(data['message'], 'Resource Not Found')
 
+    def test_get_next_question_excludes_previous_200(self):
+        questions = Question.query.filter(Question.category == 2).all()
+        previous_questions = [str(question.id) for question in questions[1:]]
+        param = {'quizCategory': "2",
+                 'previousQuestions': previous_questions}
+        res = self.client().post('/quizzes', json=param)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], questions[0].id)
+
+    def test_quiz_session_200(self):
+        res = self.client().post('/quizzes/sessions', json={'quizCategory': "2"})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        session_token = data['sessionToken']
+        seen = set()
+        for _ in range(data['totalQuestions']):
+            res = self.client().post('/quizzes', json={'sessionToken': session_token})
+            self.assertEqual(res.status_code, 200)
+            seen.add(json.loads(res.data)['question']['id'])
+        self.assertEqual(len(seen), data['totalQuestions'])
+        res = self.client().post('/quizzes', json={'sessionToken': session_token})
+        self.assertEqual(res.status_code, 404)
+
+    def test_quiz_session_404(self):
+        res = self.client().post('/quizzes', json={'sessionToken': 'expired'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertNotIn('question', data)
+        self.assertEqual(data['message'], 'Resource Not Found')
+
     def test_get_next_question_422(self):
         param = {'quizCategory': None,
                  'previousQuestions': None}
@@ -289,12 +747,94 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['message'], 'Resource Not Found')
         tearDown()
 
+    def test_get_pool_stats_200(self):
+        self.client().get('/categories')
+        res = self.client().get('/stats/pool')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertGreater(data['checkouts'], 0)
+        self.assertIn('waits', data)
+        self.assertIn('checkedOut', data)
+
+    def test_metrics_200(self):
+        self.client().get('/questions?page=1')
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'trivia_request_duration_seconds_count{method="GET",route="/questions",status="200"} 1',
+                      res.data)
+        self.assertIn(b'trivia_request_sql_statements_count{method="GET",route="/questions"} 1', res.data)
+
+    def test_query_budget_exceeded_500(self):
+        @self.app.route('/test/n-plus-one')
+        @query_budget(2)
+        def n_plus_one():
+            for question_id in range(1, 6):
+                db.session.get(Question, question_id)
+            return jsonify({'success': True})
+
+        res = self.client().get('/test/n-plus-one')
+        self.assertEqual(res.status_code, 500)
+
+    def test_read_replica_routing_200(self):
+        replica_path = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'replica.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'SQLALCHEMY_REPLICA_URI': replica_path})
+        with app.app_context():
+            db.Model.metadata.create_all(db.engines['replica'])
+            with db.engines['replica'].begin() as connection:
+                connection.execute(Category.__table__.insert().values(id=1, type='Science'))
+                connection.execute(Question.__table__.insert().values(id=1, question='Only on the replica',
+                                                                      answer='Replica', category=1, difficulty=1))
+        client = app.test_client()
+        res = client.get('/questions?ids=1')
+        data = json.loads(res.data)
+        self.assertEqual(data['questions'][0]['question'], 'Only on the replica')
+        res = client.get('/questions?ids=1', headers={'X-Read-Your-Writes': '1'})
+        data = json.loads(res.data)
+        self.assertNotIn('Only on the replica', [question['question'] for question in data['questions']])
+
+    def test_read_replica_response_cache_200(self):
+        replica_path = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'replica.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path, 'SQLALCHEMY_REPLICA_URI': replica_path})
+        with app.app_context():
+            db.Model.metadata.create_all(db.engines['replica'])
+            with db.engines['replica'].begin() as connection:
+                connection.execute(Category.__table__.insert().values(id=1, type='Science'))
+        writer = app.test_client()
+        res = writer.post('/questions', json={'question': 'Not on the replica yet', 'answer': 'Primary',
+                                              'category': 1, 'difficulty': 1})
+        question_id = json.loads(res.data)['newQuestionId']
+        try:
+            # another client's listing is rendered from the replica and cached
+            res = app.test_client().get('/categories/1/questions')
+            self.assertNotIn(question_id, [question['id'] for question in json.loads(res.data)['questions']])
+            res = writer.get('/categories/1/questions')
+            self.assertIn(question_id, [question['id'] for question in json.loads(res.data)['questions']])
+            res = app.test_client().get('/categories/1/questions', headers={'X-Read-Your-Writes': '1'})
+            self.assertIn(question_id, [question['id'] for question in json.loads(res.data)['questions']])
+        finally:
+            with app.app_context():
+                Question.delete_many([question_id])
+
     def test_get_categories_200(self):
         res = self.client().get('/categories')
         data = json.loads(res.data)
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['categories'])
 
+    def test_get_categories_cache_invalidated(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+        self.assertNotIn('7', data['categories'])
+        new_category = Category(7, 'Music')
+        new_category.insert()
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+        self.assertEqual(data['categories']['7'], 'Music')
+        new_category.delete()
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+        self.assertNotIn('7', data['categories'])
+
     def test_get_categories_404(self):
         def setUp():
             categories = Category.query.all()